@@ -1,22 +1,42 @@
-
 from __future__ import print_function
-from config import config
+import sys
+
+# the build information is read from the configuration on first use,
+# attribute:option pairs of the "installed-options" section
+_INSTALLED = {"__version__"     : "version",
+              "__author__"      : "author",
+              "__description__" : "description",
+              "__pyversion__"   : "python_version",
+              "__directory__"   : "install_directory",
+              "__buildtime__"   : "build_time"}
+
+def _installed(option):
+    from config import GetConfig
+    return GetConfig().get("installed-options", option)
 
-# extract some build information
-__name__        = config.get("installed-options", "name")
-__version__     = config.get("installed-options", "version")
-__author__      = config.get("installed-options", "author")
-__description__ = config.get("installed-options", "description")
-__pyversion__   = config.get("installed-options", "python_version")
-__directory__   = config.get("installed-options", "install_directory")
-__buildtime__   = config.get("installed-options", "build_time")
+def __getattr__(name):
+    """
+    Read the configuration when it or the build information is first accessed,
+    this only works on python 3.7 and above, see PEP 562
+    """
+    if (name == "config"):
+        from config import GetConfig
+        return GetConfig()
+    if (name in _INSTALLED):
+        return _installed(_INSTALLED[name])
+    raise AttributeError("module {} has no attribute {}".format(__name__, name))
+
+if (sys.version_info < (3, 7)): # no lazy module attributes, read everything now
+    from config import config
+    for _k in _INSTALLED.keys():
+        globals()[_k] = _installed(_INSTALLED[_k])
 
 def info():
-    print("\nPackage name = {}, version = {}\n".format(__name__, __version__))
-    print(  "      Author = {}\n".format(__author__))
-    print(  " Description = {}\n".format(__description__))
-    print("\tPython version  --- {}".format(__pyversion__))
-    print("\tBuild directory --- {}".format(__directory__))
-    print("\tBuild date/time --- {}".format(__buildtime__))
+    print("\nPackage name = {}, version = {}\n".format(_installed("name"),
+          _installed("version")))
+    print(  "      Author = {}\n".format(_installed("author")))
+    print(  " Description = {}\n".format(_installed("description")))
+    print("\tPython version  --- {}".format(_installed("python_version")))
+    print("\tBuild directory --- {}".format(_installed("install_directory")))
+    print("\tBuild date/time --- {}".format(_installed("build_time")))
     print()
-
@@ -0,0 +1,139 @@
+"""
+Persistent on-disk cache of the per-file scan results
+
+Examples
+--------
+>>> from cache import ParseCache
+>>> cache = ParseCache("/path/to/source/.f90tree")
+>>> scan = cache.get(filename)   # None if the file changed since it was stored
+>>> cache.put(filename, ScanFile(filename), stamp) # (mtime, size) before the scan
+>>> cache.close()
+"""
+from __future__ import print_function
+import os
+import sqlite3
+import hashlib
+import pickle
+from parsers import SCANNER_VERSION
+
+# bump this whenever the layout of the database changes
+CACHE_VERSION = 1
+
+class ParseCache(object):
+    """
+    SQLite backed cache of FileScan objects
+
+    Entries are keyed by the absolute filename and are only served if the
+    modification time and size of the file still match. If use_hash is True,
+    a content hash is stored as well and an entry whose mtime changed, e.g.,
+    after a fresh checkout, is still served if the content is identical.
+
+    Args
+    ----
+    directory : str
+        The directory that holds the cache database, created if needed
+    use_hash : bool, optional
+        Validate the entries using a hash of the file contents
+    """
+
+    filename = "cache.sqlite"
+
+    def __init__(self, directory, use_hash=False):
+        if (not os.path.isdir(directory)):
+            os.makedirs(directory)
+        self.directory = directory
+        self.use_hash  = use_hash
+        self.hits      = 0
+        self.misses    = 0
+
+        self.db = sqlite3.connect(os.path.join(directory, self.filename))
+        self.db.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        self.db.execute("CREATE TABLE IF NOT EXISTS scans (path TEXT PRIMARY KEY, "
+                        "mtime REAL, size INTEGER, hash TEXT, scan BLOB)")
+
+        # throw away everything that was written by a different scanner
+        version = "{}.{}".format(CACHE_VERSION, SCANNER_VERSION)
+        row = self.db.execute("SELECT value FROM meta WHERE key='version'").fetchone()
+        if ((row is None) or (row[0] != version)):
+            self.db.execute("DELETE FROM scans")
+            self.db.execute("INSERT OR REPLACE INTO meta VALUES ('version', ?)", (version,))
+            self.db.commit()
+
+    def get(self, filename):
+        """
+        Return the cached FileScan of the given file, None if there is no valid entry
+        """
+        try:
+            st = os.stat(filename)
+        except OSError:
+            return None
+
+        row = self.db.execute("SELECT mtime, size, hash, scan FROM scans WHERE path=?",
+                              (filename,)).fetchone()
+        if ((row is None) or (row[1] != st.st_size)):
+            self.misses += 1
+            return None
+
+        if (row[0] != st.st_mtime):
+            if (not self.use_hash) or (row[2] != _hash(filename)):
+                self.misses += 1
+                return None
+            self.db.execute("UPDATE scans SET mtime=? WHERE path=?",
+                            (st.st_mtime, filename))
+
+        self.hits += 1
+        return pickle.loads(bytes(row[3]))
+
+    def put(self, filename, scan, stamp=None):
+        """
+        Store the FileScan of the given file
+
+        Args
+        ----
+        filename : str
+            The scanned file
+        scan : FileScan
+            The scan results
+        stamp : tuple, optional
+            The (mtime, size) of the file taken before it was scanned. If the
+            file changed during the scan, the entry then no longer matches and
+            the file is scanned again. Taken now if not given
+        """
+        if (stamp is None):
+            st = os.stat(filename)
+            stamp = (st.st_mtime, st.st_size)
+        h = None
+        if (self.use_hash):
+            h = _hash(filename)
+            st = os.stat(filename)
+            if ((st.st_mtime, st.st_size) != stamp): # the hash is of the new contents
+                h = None
+        blob = sqlite3.Binary(pickle.dumps(scan, pickle.HIGHEST_PROTOCOL))
+        self.db.execute("INSERT OR REPLACE INTO scans VALUES (?, ?, ?, ?, ?)",
+                        (filename, stamp[0], stamp[1], h, blob))
+
+    def prune(self, filenames):
+        """
+        Remove the entries of all files that are not in the given list
+        """
+        keep = set(filenames)
+        paths = [r[0] for r in self.db.execute("SELECT path FROM scans")]
+        stale = [(p,) for p in paths if p not in keep]
+        self.db.executemany("DELETE FROM scans WHERE path=?", stale)
+
+    def close(self):
+        """
+        Write all changes to disk and close the database
+        """
+        self.db.commit()
+        self.db.close()
+
+def _hash(filename):
+    """
+    Return the SHA-1 hash of the file contents
+    """
+    h = hashlib.sha1()
+    with open(filename, 'rb') as mf:
+        for block in iter(lambda: mf.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
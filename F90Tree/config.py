@@ -1,6 +1,8 @@
 """
 Read the various configuration files
 
+The files are read the first time the configuration is used, not on import
+
 Examples
 --------
 >>> import F90Tree as FT
@@ -35,20 +37,58 @@ else:
     from configparser import ConfigParser
     installed_opts_cfg = "__installed_options_py3.cfg"
 
-F90TreeDir = os.environ['F90TreeDir']
+def InstallDirectory():
+    """
+    Return the installation directory, taken from the F90TreeDir environment
+    variable, or None if it is not set
+    """
+    return os.environ.get("F90TreeDir")
+
+_config = None # the configuration, read on first use
+
+def GetConfig():
+    """
+    Read the configuration files the first time this is called and return the
+    configuration. The files of the installation directory are skipped if
+    F90TreeDir is not set
+    """
+    global _config
+    if (_config is not None):
+        return _config
+
+    F90TreeDir = InstallDirectory()
+
+    # create configuration file object
+    config = ConfigParser()
+
+    # read defaults from installation directory
+    if (F90TreeDir is not None):
+        config.read(os.path.join(F90TreeDir, 'f90tree.cfg'))
 
-# create configuration file object
-config = ConfigParser()
+    # read defaults from user's home directory
+    config.read(os.path.expanduser('~/.f90tree/f90tree.cfg'))
 
-# read defaults from installation directory
-config.read(os.path.join(F90TreeDir, 'f90tree.cfg'))
+    # read defaults from local directory
+    config.read('f90tree.cfg')
 
-# read defaults from user's home directory
-config.read(os.path.expanduser('~/.f90tree/f90tree.cfg'))
+    # override any issues that the installation process detected
+    if (F90TreeDir is not None):
+        config.read(os.path.join(F90TreeDir, installed_opts_cfg))
 
-# read defaults from local directory
-config.read('f90tree.cfg')
+    _config = config
+    return _config
 
-# override any issues that the installation process detected
-config.read(os.path.join(F90TreeDir, installed_opts_cfg))
+def __getattr__(name):
+    """
+    Read the configuration when config or F90TreeDir is first accessed, this
+    only works on python 3.7 and above, see PEP 562
+    """
+    if (name == "config"):
+        return GetConfig()
+    if (name == "F90TreeDir"):
+        return InstallDirectory()
+    raise AttributeError("module {} has no attribute {}".format(__name__, name))
 
+if (sys.version_info < (3, 7)): # no lazy module attributes, read everything now
+    F90TreeDir = InstallDirectory()
+    config = GetConfig()
@@ -0,0 +1,708 @@
+"""
+Build the call graph once and expand the calling tree from it
+"""
+from __future__ import print_function
+from array import array
+from collections import OrderedDict
+
+# number of shortest paths that are remembered, see CallGraph.path
+PATHS = 256
+
+class CallGraph(object):
+    """
+    Call graph built from the resolved calls of every routine
+
+    Each routine is expanded at most once, any later reference to a routine
+    whose subtree was already emitted is marked as a repeat instead of being
+    walked again. Building the tree is linear in the number of routines plus
+    the number of calls.
+
+    Recursive routines and mutually recursive groups are found as strongly
+    connected components and collapsed into a single node. All traversals use
+    an explicit stack or queue, so the depth of the tree is not bounded by the
+    Python recursion limit. The reachability queries run a fresh search every
+    time with one byte of scratch space per routine, nothing that grows with
+    the number of reachable pairs is kept, so a deep chain of calls costs
+    linear time and memory.
+
+    Every routine name is stored once in a string table and is referred to by
+    its integer node id everywhere else. The calls are kept in compressed
+    sparse row form: the calls made by node u are targets[offsets[u]:offsets[u+1]]
+    and their calltypes are the matching entries of types, one byte per call.
+    The routine names are only looked up at the edges of the public methods.
+
+    Every call site of the same routine is collapsed into a single edge, so the
+    traversals cost one step per unique (caller, callee) pair. Each edge keeps
+    the number of call sites in counts and the line numbers of the sites in
+    lines[line_offsets[e]:line_offsets[e+1]], see sites.
+
+    Args
+    ----
+    calls : dict or iterable
+        Dictionary holding routine_name:[list of routine calls] pairs, where
+        each call is a list of [name, calltype] or [name, calltype, lineno],
+        or any iterable of such (routine_name, [list of routine calls]) pairs.
+        If a routine is given more than once, its last list of calls is kept.
+        The calltype of an edge is the calltype of its first call site
+    """
+
+    def __init__(self, calls):
+        self.names = [] # string table, node id:routine name
+        self.ids   = {} # routine name:node id
+
+        # collect the edges in the order they are given, a routine that is
+        # given again leaves its old row behind, it is dropped below
+        rows    = array('i') # (node id, first edge, end of the edges) triplets
+        targets = array('i')
+        types   = array('B')
+        counts  = array('i')
+        lines   = array('i')
+        line_offsets = array('i', [0])
+        items = calls.items() if hasattr(calls, "items") else calls
+        for name, called in items:
+            u = self._intern(name)
+            first = len(targets)
+            edges = {} # callee node id:[calltype, number of sites, [line numbers]]
+            order = []
+            for call in called:
+                v = self._intern(call[0])
+                edge = edges.get(v)
+                if (edge is None):
+                    edge = edges[v] = [call[1], 0, []]
+                    order.append(v)
+                edge[1] += 1
+                if (len(call) > 2):
+                    edge[2].append(call[2])
+            for v in order:
+                ctype, count, sites = edges[v]
+                targets.append(v)
+                types.append(ord(ctype))
+                counts.append(count)
+                lines.extend(sites)
+                line_offsets.append(len(lines))
+            rows.extend((u, first, len(targets)))
+
+        n = len(self.names)
+        lo = array('i', [0])*n
+        hi = array('i', [0])*n
+        self.defined = bytearray(n) # 1 if the calls made by the node are known
+        for r in range(0, len(rows), 3):
+            u = rows[r]
+            lo[u] = rows[r+1]; hi[u] = rows[r+2]
+            self.defined[u] = 1
+
+        self.offsets = array('i', [0])*(n+1)
+        self.targets = array('i')
+        self.types   = array('B')
+        self.counts  = array('i')
+        self.lines   = array('i')
+        self.line_offsets = array('i', [0])
+        for u in range(n):
+            self.targets.extend(targets[lo[u]:hi[u]])
+            self.types.extend(types[lo[u]:hi[u]])
+            self.counts.extend(counts[lo[u]:hi[u]])
+            for e in range(lo[u], hi[u]):
+                self.lines.extend(lines[line_offsets[e]:line_offsets[e+1]])
+                self.line_offsets.append(len(self.lines))
+            self.offsets[u+1] = len(self.targets)
+
+        self._paths     = OrderedDict() # the latest PATHS (source, target):shortest path
+        self._children  = {} # memoized (component, node id):[calls leaving the component]
+        self._cycles    = {} # memoized component:tuple of routine names, recursive only
+        self._roffsets  = None # reverse calls in CSR form, built on first use
+        self._rsources  = None
+        self._component = array('i', [0])*n # node id:component index
+        self._members   = array('i') # node ids grouped by component
+        self._first     = array('i', [0]) # component index:offset into _members
+        self._cyclic    = bytearray() # component index:1 if the component is recursive
+        self._find_components()
+
+    def __len__(self):
+        return len(self.names)
+
+    def _intern(self, name):
+        """
+        Return the node id of the given routine, adding it to the string table
+        if it is new
+        """
+        u = self.ids.get(name)
+        if (u is None):
+            u = len(self.names)
+            self.ids[name] = u
+            self.names.append(name)
+        return u
+
+    def successors(self, u):
+        """
+        Return the node ids called by node u
+        """
+        return self.targets[self.offsets[u]:self.offsets[u+1]]
+
+    def predecessors(self, u):
+        """
+        Return the node ids that call node u, each caller is listed once
+
+        The reverse index is built on the first call, it is a second CSR over
+        the same edges, sorted by callee
+        """
+        if (self._roffsets is None):
+            n = len(self.names)
+            roffsets = array('i', [0])*(n+1)
+            for v in self.targets: # count the callers of each node
+                roffsets[v+1] += 1
+            for v in range(n):
+                roffsets[v+1] += roffsets[v]
+            fill = array('i', roffsets[:n])
+            rsources = array('i', [0])*len(self.targets)
+            for w in range(n):
+                for i in range(self.offsets[w], self.offsets[w+1]):
+                    v = self.targets[i]
+                    rsources[fill[v]] = w; fill[v] += 1
+            self._roffsets = roffsets
+            self._rsources = rsources
+        return self._rsources[self._roffsets[u]:self._roffsets[u+1]]
+
+    def called_by(self, name):
+        """
+        Return the list of routines that call the given routine directly
+        """
+        u = self.ids.get(name)
+        if (u is None):
+            return []
+        names = self.names
+        return [names[w] for w in self.predecessors(u)]
+
+    def out_edges(self, u):
+        """
+        Return the list of (node id, calltype, edge index) triplets of the
+        calls made by node u, the edge index is used with counts and edge_lines
+        """
+        lo = self.offsets[u]; hi = self.offsets[u+1]
+        return list(zip(self.targets[lo:hi], [chr(t) for t in self.types[lo:hi]],
+                        range(lo, hi)))
+
+    def edge_lines(self, e):
+        """
+        Return the line numbers of the call sites of the given edge index
+        """
+        return self.lines[self.line_offsets[e]:self.line_offsets[e+1]].tolist()
+
+    def callees(self, name):
+        """
+        Return the list of routines called directly by the given routine
+        """
+        u = self.ids.get(name)
+        if (u is None):
+            return []
+        names = self.names
+        return [names[v] for v in self.successors(u)]
+
+    def edges(self, name):
+        """
+        Return the list of (callee, calltype) pairs of the calls made by the given routine
+        """
+        u = self.ids.get(name)
+        if (u is None):
+            return []
+        names = self.names
+        return [(names[v], t) for v, t, e in self.out_edges(u)]
+
+    def sites(self, name):
+        """
+        Return the call sites of the given routine
+
+        Args
+        ----
+        name : str
+            The calling routine
+
+        Returns
+        -------
+        sites : list
+            List of (callee, calltype, count, lines) tuples, one for every
+            routine that is called, where count is the number of call sites and
+            lines holds their line numbers in the file of the caller. The lines
+            are empty if the sites are not known, e.g., for the dispatch from a
+            generic interface to its specific procedures
+        """
+        u = self.ids.get(name)
+        if (u is None):
+            return []
+        names = self.names
+        return [(names[v], t, self.counts[e], self.edge_lines(e))
+                for v, t, e in self.out_edges(u)]
+
+    def ncalls(self, name):
+        """
+        Return the number of calls made by the given routine
+        """
+        u = self.ids.get(name)
+        if (u is None):
+            return 0
+        return self.offsets[u+1] - self.offsets[u]
+
+    def routines(self):
+        """
+        Return a list of every routine in the graph, including routines that
+        are only called and never make any calls themselves
+        """
+        return list(self.names)
+
+    def callers(self):
+        """
+        Return a list of the routines whose calls were given, i.e., every
+        routine that was scanned, even if it makes no calls
+        """
+        return [self.names[u] for u in range(len(self.names)) if self.defined[u]]
+
+    def nbytes(self):
+        """
+        Return the number of bytes held by the arrays of the graph, the string
+        table and the name:node id dictionary are not included
+        """
+        arrays = [self.offsets, self.targets, self.types, self.counts, self.lines,
+                  self.line_offsets, self._component, self._members, self._first]
+        if (self._roffsets is not None):
+            arrays += [self._roffsets, self._rsources]
+        return sum([a.itemsize*len(a) for a in arrays]) + len(self.defined) + \
+               len(self._cyclic)
+
+    def _find_components(self):
+        """
+        Find the strongly connected components using an iterative version of
+        Tarjan's algorithm. Components are numbered in reverse topological
+        order, i.e., a component only calls into components with a lower index
+        """
+        n = len(self.names)
+        offsets = self.offsets
+        targets = self.targets
+        index   = array('i', [-1])*n # node id:order of discovery
+        lowlink = array('i', [0])*n
+        onstack = bytearray(n)
+        stack   = []
+        counter = 0
+
+        for start in range(n):
+            if (index[start] >= 0): continue
+
+            index[start] = lowlink[start] = counter; counter += 1
+            stack.append(start); onstack[start] = 1
+            work = [start]            # nodes being visited
+            pos  = [offsets[start]]   # the next call to look at for each node
+
+            while (len(work) > 0):
+                u = work[-1]
+                i = pos[-1]; end = offsets[u+1]
+                descended = False
+                while (i < end):
+                    v = targets[i]; i += 1
+                    if (index[v] < 0): # not visited yet, descend into it
+                        pos[-1] = i
+                        index[v] = lowlink[v] = counter; counter += 1
+                        stack.append(v); onstack[v] = 1
+                        work.append(v); pos.append(offsets[v])
+                        descended = True
+                        break
+                    elif (onstack[v] and (index[v] < lowlink[u])):
+                        lowlink[u] = index[v]
+                if (descended): continue
+
+                work.pop(); pos.pop()
+                if (len(work) > 0): # propagate the lowlink to the caller
+                    caller = work[-1]
+                    if (lowlink[u] < lowlink[caller]):
+                        lowlink[caller] = lowlink[u]
+
+                if (lowlink[u] == index[u]): # u is the root of a component
+                    members = []
+                    while True:
+                        m = stack.pop(); onstack[m] = 0
+                        members.append(m)
+                        if (m == u): break
+                    members.reverse()
+                    comp = len(self._cyclic)
+                    for m in members:
+                        self._component[m] = comp
+                    self._members.extend(members)
+                    self._first.append(len(self._members))
+                    self._cyclic.append((len(members) > 1) or (u in self.successors(u)))
+
+    def ncomponents(self):
+        """
+        Return the number of strongly connected components. Components are
+        numbered in reverse topological order, the calls that leave a
+        component always go to a component with a lower index
+        """
+        return len(self._cyclic)
+
+    def components(self):
+        """
+        Return the component index of every node as an array indexed by node
+        id, shared with the graph, it must not be modified
+        """
+        return self._component
+
+    def component_of(self, u):
+        """
+        Return the index of the component that holds node u
+        """
+        return self._component[u]
+
+    def members(self, comp):
+        """
+        Return the node ids of the given component
+        """
+        return self._members[self._first[comp]:self._first[comp+1]]
+
+    def recursive(self, comp):
+        """
+        Return True if the given component is a recursive cycle, i.e., it
+        holds several routines or a single routine that calls itself
+        """
+        return bool(self._cyclic[comp])
+
+    def _names(self, comp):
+        """
+        Return the routine names of a recursive component, an empty tuple is
+        returned if the component is not recursive
+        """
+        if (not self._cyclic[comp]):
+            return ()
+        if (comp not in self._cycles):
+            self._cycles[comp] = tuple([self.names[m] for m in self.members(comp)])
+        return self._cycles[comp]
+
+    def cycle(self, name):
+        """
+        Return the routines in the recursive cycle that holds the given routine,
+        an empty tuple is returned if the routine is not recursive
+        """
+        return self._names(self._component[self.ids[name]])
+
+    def cycles(self):
+        """
+        Return a list of all recursive cycles, each as a tuple of routine names
+        """
+        return [self._names(i) for i in range(len(self._cyclic)) if self._cyclic[i]]
+
+    def _kids(self, u):
+        """
+        Return the node ids called by the node that holds u, see children
+        """
+        comp = self._component[u]
+        if (not self._cyclic[comp]):
+            return self.successors(u)
+
+        key = (comp, u)
+        if (key not in self._children):
+            members = [u] + [m for m in self.members(comp) if m != u]
+            kids = array('i')
+            for m in members:
+                for c in self.successors(m):
+                    if (self._component[c] != comp):
+                        kids.append(c)
+            self._children[key] = kids
+        return self._children[key]
+
+    def children(self, name):
+        """
+        Return the calls made by the node that holds the given routine. For a
+        recursive cycle, the calls made by all members that leave the cycle are
+        returned, starting with the calls made by the given routine
+        """
+        names = self.names
+        return [names[v] for v in self._kids(self.ids[name])]
+
+    def _visit(self, starts, step):
+        """
+        Return the node ids that can be reached from any of the start nodes by
+        following step one or more times, in breadth first order. A start node
+        is only part of the result if it is reached again, i.e., if it is
+        recursive or called from another start node. The scratch space is a
+        single byte per node, nothing is kept after the search
+        """
+        seen = bytearray(len(self.names))
+        queue = array('i')
+        for u in starts:
+            for v in step(u):
+                if (not seen[v]):
+                    seen[v] = 1
+                    queue.append(v)
+        i = 0
+        while (i < len(queue)):
+            u = queue[i]; i += 1
+            for v in step(u):
+                if (not seen[v]):
+                    seen[v] = 1
+                    queue.append(v)
+        return queue
+
+    def reachable(self, name):
+        """
+        Return the set of all routines that can be reached from the given routine
+
+        Args
+        ----
+        name : str
+            The routine name where the search begins
+
+        Returns
+        -------
+        reached : frozenset
+            All routines called directly or indirectly by the routine, found
+            with a single breadth first search, linear in the size of the
+            part of the graph below the routine
+        """
+        names = self.names
+        return frozenset([names[v] for v in self._visit([self.ids[name]], self.successors)])
+
+    def nreachable(self, name, *more):
+        """
+        Return the number of routines that can be reached from the given
+        routines, the same as len(reachable(name)) without building the names.
+        Several routines are searched together in a single pass
+        """
+        ids = self.ids
+        return len(self._visit([ids[n] for n in (name,) + more], self.successors))
+
+    def ancestors(self, name):
+        """
+        Return the set of all routines that call the given routine directly
+        or indirectly, a single breadth first search over the reverse calls
+        """
+        names = self.names
+        return frozenset([names[v] for v in self._visit([self.ids[name]], self.predecessors)])
+
+    def path(self, source, target):
+        """
+        Return the shortest calling path between two routines
+
+        Args
+        ----
+        source : str
+            The routine where the path begins
+        target : str
+            The routine that is called at the end of the path
+
+        Returns
+        -------
+        path : list
+            The routine names along the path, starting with source and ending
+            with target, None if source never calls target
+        """
+        s = self.ids[source]; t = self.ids[target]
+        key = (s, t)
+        if (key in self._paths):
+            path = self._paths.pop(key) # most recently used last
+            self._paths[key] = path
+            return path
+
+        parent = array('i', [-1])*len(self.names)
+        parent[s] = s
+        queue = array('i', [s]); i = 0
+        while (i < len(queue)) and (parent[t] < 0): # breadth first search
+            u = queue[i]; i += 1
+            for v in self.successors(u):
+                if (parent[v] < 0):
+                    parent[v] = u
+                    queue.append(v)
+        path = None
+        if (parent[t] >= 0):
+            path = [t]
+            while (path[-1] != s):
+                path.append(parent[path[-1]])
+            path = [self.names[v] for v in reversed(path)]
+
+        self._paths[key] = path
+        while (len(self._paths) > PATHS):
+            self._paths.popitem(last=False)
+        return path
+
+    def unreachable(self, roots):
+        """
+        Return the routines that can not be reached from any of the roots
+
+        Args
+        ----
+        roots : list
+            The routines where the program starts, e.g., the main programs
+
+        Returns
+        -------
+        dead : list
+            The routines whose calls are known, i.e., every routine that was
+            scanned, that are neither a root nor called from one, in the
+            order of the node ids
+        """
+        starts = [self.ids[root] for root in roots]
+        reached = bytearray(len(self.names))
+        for u in starts:
+            reached[u] = 1
+        for v in self._visit(starts, self.successors):
+            reached[v] = 1
+        return [self.names[u] for u in range(len(self.names))
+                if self.defined[u] and not reached[u]]
+
+    def _stale(self, changed):
+        """
+        Return a byte per node, 1 if the node is one of the changed routines
+        or calls one of them directly or indirectly
+        """
+        starts = [self.ids[name] for name in changed if name in self.ids]
+        stale = bytearray(len(self.names))
+        for u in starts:
+            stale[u] = 1
+        if (len(starts) > 0):
+            for v in self._visit(starts, self.predecessors):
+                stale[v] = 1
+        return stale
+
+    def inherit(self, old, changed):
+        """
+        Take over the memoized results of an older graph of the same code
+
+        A routine that reaches none of the changed routines, in the old graph
+        and in this one, sees the same calls below it in both graphs. Its
+        shortest paths, its recursive cycle and the calls leaving that cycle
+        are still valid and are kept, everything else is dropped. Costs two
+        searches over the reverse calls, linear in the size of the graphs
+
+        Args
+        ----
+        old : CallGraph
+            The graph this one replaces
+        changed : set
+            The routines whose list of callees differs between the two graphs,
+            including the routines that were added or removed
+        """
+        if ((len(old._paths) == 0) and (len(old._children) == 0) and
+            (len(old._cycles) == 0)):
+            return
+        was = old._stale(changed)
+        now = self._stale(changed)
+        ids = self.ids
+        def keep(u): # node id in old:node id in self, None if the routine is stale
+            v = ids.get(old.names[u])
+            if (was[u]) or (v is None) or (now[v]):
+                return None
+            return v
+
+        for (s, t), path in old._paths.items(): # least recently used first
+            a = keep(s)
+            b = ids.get(old.names[t])
+            if (a is not None) and (b is not None):
+                self._paths[(a, b)] = path
+        # the members of a cycle are ordered by node id, which differs between
+        # the graphs, the results only carry over if the order is the same
+        same = {} # component in old:component in self, None if it differs
+        def component(comp):
+            if (comp not in same):
+                members = old.members(comp)
+                a = keep(members[0])
+                c = None if (a is None) else self._component[a]
+                if ((c is not None) and ([old.names[m] for m in members] !=
+                                         [self.names[m] for m in self.members(c)])):
+                    c = None
+                same[comp] = c
+            return same[comp]
+        for (comp, u), kids in old._children.items():
+            c = component(comp)
+            if (c is not None):
+                self._children[(c, ids[old.names[u]])] = array('i',
+                    [ids[old.names[v]] for v in kids])
+        for comp, members in old._cycles.items():
+            c = component(comp)
+            if (c is not None):
+                self._cycles[c] = members
+
+    def tree(self, root, expanded=None, max_depth=None, prune=None, collapse=True):
+        """
+        Generate the calling tree below the given routine
+
+        Args
+        ----
+        root : str
+            The routine at the top of the tree
+        expanded : set, optional
+            Components whose subtree was already emitted, share this between
+            calls to mark repeats across several trees
+        max_depth : int, optional
+            Routines deeper than this are left out, the tree is not expanded
+            below this depth. A subtree that was cut is expanded again if the
+            routine shows up higher in the tree later on
+        prune : function, optional
+            Called with a routine name, the routine and its subtree are left
+            out if it returns True, see utilities.CompileRoutinePatterns. The
+            root is never pruned
+        collapse : bool, optional
+            Expand a subtree only once and mark later references to it as a
+            repeat. If False, every reference is expanded, which can produce
+            a very large tree unless max_depth is given. Recursive cycles are
+            collapsed either way
+
+        Returns
+        -------
+        nodes : generator
+            Generates (depth, name, repeat, cycle, hidden) tuples in calling
+            order. The repeat flag is True if the subtree of name was already
+            emitted above, cycle holds the members of the recursive cycle that
+            was collapsed into this node, empty if name is not recursive, and
+            hidden is the number of calls made by name that are not shown
+            because of max_depth. Nothing is computed for the nodes that are
+            not consumed, so the cost only depends on what is generated
+        """
+        if (expanded is None):
+            expanded = set()
+        names = self.names
+        pruned = {} # node id:prune(name), memoized
+
+        stack = [(self.ids[root], 0)]
+        while (len(stack) > 0):
+            u, depth = stack.pop()
+            comp = self._component[u]
+            kids = self._kids(u)
+            if ((prune is not None) and (len(kids) > 0)):
+                for c in kids:
+                    if (c not in pruned):
+                        pruned[c] = prune(names[c])
+                kids = [c for c in kids if not pruned[c]]
+
+            repeat = collapse and (comp in expanded) and (len(kids) > 0)
+            hidden = 0
+            if ((max_depth is not None) and (depth >= max_depth) and not repeat):
+                hidden = len(kids)
+            yield depth, names[u], repeat, self._names(comp), hidden
+            if (repeat or (hidden > 0)): continue
+            expanded.add(comp)
+
+            for c in reversed(kids):
+                stack.append((c, depth+1))
+
+    def forest(self, roots, max_depth=None, prune=None, collapse=True):
+        """
+        Generate the calling trees of several roots one after the other, a
+        subtree that is shared by several roots is only expanded once unless
+        collapse is False, see tree for the arguments and the generated tuples
+        """
+        expanded = set()
+        for root in roots:
+            for node in self.tree(root, expanded, max_depth, prune, collapse):
+                yield node
+
+def FormatNode(depth, name, repeat, cycle=(), hidden=0, indent="    "):
+    """
+    Format a single calling tree entry, i.e., "    |-name"
+    """
+    if (depth == 0):
+        line = name
+    else:
+        line = indent*depth + "|-" + name
+    if (len(cycle) == 1):
+        line += " (recursive)"
+    elif (len(cycle) > 1):
+        line += " (recursive cycle: {})".format(", ".join(cycle))
+    if (repeat):
+        line += " (see above)"
+    if (hidden > 0):
+        line += " ({} call{} not shown)".format(hidden, "s" if (hidden > 1) else "")
+    return line
@@ -0,0 +1,326 @@
+"""
+Summary statistics of a call graph: fan-in and fan-out distributions, the
+depth of every routine below the roots, the sizes of the recursive cycles and
+the hub routines that the most calling paths run through
+
+Everything is computed in a few linear passes over the compressed arrays of
+the graph, see graph.CallGraph. The degrees and the edges between components
+are computed with numpy when it is installed, the same numbers are computed
+in pure python otherwise.
+
+The hubs are found by counting paths over the condensation of the graph, the
+DAG of its strongly connected components: up[c] is the number of calling
+paths from the roots down to component c and down[c] the number of paths from
+c to a routine that calls nothing. A calling path from a root to a leaf runs
+through c in up[c]*down[c] ways, the score of c is the fraction of all such
+paths. The counts grow exponentially with the depth, so they are exact python
+integers that can not overflow, only the score, between 0 and 1, is a float.
+
+Examples
+--------
+>>> report = Statistics(graph, roots=["driver"], label=table.label)
+>>> report["fan_in"]["max"], report["fan_in"]["top"][0]
+(212, {'routine': 'check_err', 'value': 212})
+>>> report["hubs"]["top"][0]
+{'routine': 'solver::step', 'members': ['solver::step'], 'score': 0.91, ...}
+>>> Write(report, "stats.json")
+"""
+from __future__ import print_function, division
+import json
+from collections import OrderedDict, deque
+
+try:
+    import numpy
+except ImportError: # the pure python version is used
+    numpy = None
+
+def Statistics(graph, roots=None, label=None, top=10):
+    """
+    Compute the summary statistics of a call graph
+
+    Args
+    ----
+    graph : CallGraph
+        The call graph
+    roots : list, optional
+        The routines where the calling paths begin, e.g., the programs. By
+        default every routine that is not called from outside of its own
+        recursive cycle is a root, and only the top roots with the longest
+        calling chains are listed per root
+    label : function, optional
+        Maps a routine name to its display name, defaults to the name itself
+    top : int, optional
+        Number of routines reported in each top list
+
+    Returns
+    -------
+    report : ordered dict
+        The statistics, only made of numbers, strings, lists and dictionaries
+        so it can be saved as JSON, see Write
+    """
+    if (label is None):
+        label = lambda x: x
+    names = graph.names
+    n = len(graph)
+    fan_out, fan_in = Degrees(graph)
+    cu, cv = ComponentEdges(graph)
+
+    report = OrderedDict()
+    report["routines"]   = n
+    report["defined"]    = sum(graph.defined)
+    report["calls"]      = len(graph.targets)
+    report["call_sites"] = sum(graph.counts)
+    report["backend"]    = "numpy" if (numpy is not None) else "python"
+    report["fan_out"]    = Distribution(fan_out, names, label, top)
+    report["fan_in"]     = Distribution(fan_in, names, label, top)
+
+    # the recursive cycles
+    ncomp = graph.ncomponents()
+    cyclic = [c for c in range(ncomp) if graph.recursive(c)]
+    sizes = [len(graph.members(c)) for c in cyclic]
+    histogram = OrderedDict()
+    for s in sorted(set(sizes)):
+        histogram[str(s)] = sizes.count(s)
+    largest = sorted(cyclic, key=lambda c: len(graph.members(c)), reverse=True)[:top]
+    report["components"] = OrderedDict([
+        ("count", ncomp), ("recursive", len(sizes)),
+        ("in_cycles", sum(sizes)), ("sizes", histogram),
+        ("largest", [OrderedDict([("size", len(graph.members(c))),
+                                  ("members", [label(names[m]) for m in graph.members(c)])])
+                     for c in largest])])
+
+    # the roots, by default the members of the components nobody calls
+    component_of = graph.component_of
+    if (roots is None):
+        called = set(cv)
+        root_ids = [u for u in range(n) if component_of(u) not in called]
+    else:
+        root_ids = [graph.ids[r] for r in roots]
+    sources = sorted(set([component_of(u) for u in root_ids]))
+
+    up, down, height = PathCounts(ncomp, cu, cv, sources)
+    depth = Depths(graph, root_ids)
+
+    reached = [d for d in depth if d >= 0]
+    listed = root_ids
+    if (roots is None):
+        listed = sorted(root_ids, key=lambda u: height[component_of(u)], reverse=True)[:top]
+    histogram = OrderedDict()
+    for d in range(max(reached) + 1 if (len(reached) > 0) else 0):
+        histogram[str(d)] = 0
+    for d in reached:
+        histogram[str(d)] += 1
+    report["depth"] = OrderedDict([
+        ("roots", len(root_ids)), ("reached", len(reached)),
+        ("unreached", n - len(reached)),
+        ("max", max(reached) if (len(reached) > 0) else None),
+        ("mean", float(sum(reached))/len(reached) if (len(reached) > 0) else None),
+        ("histogram", histogram),
+        ("per_root", [OrderedDict([("root", label(names[u])),
+                                   ("height", height[component_of(u)]),
+                                   ("calls", fan_out[u])]) for u in listed])])
+
+    # the hubs, the routines the most root to leaf paths run through, the
+    # roots and the leaves themselves are left out
+    total = sum([down[c] for c in sources])
+    leaves = set(range(ncomp)) - set(cu)
+    candidates = [c for c in range(ncomp)
+                  if (up[c] > 0) and (c not in leaves) and (c not in sources)]
+    candidates.sort(key=lambda c: up[c]*down[c], reverse=True)
+    hubs = []
+    for c in candidates[:top]:
+        members = [label(names[m]) for m in graph.members(c)]
+        hubs.append(OrderedDict([
+            ("routine", members[0]), ("members", members),
+            ("score", up[c]*down[c]/total if (total > 0) else None),
+            ("paths_in", up[c]), ("paths_out", down[c])]))
+    report["hubs"] = OrderedDict([("paths", total), ("top", hubs)])
+    return report
+
+def Degrees(graph):
+    """
+    Return the fan-out and the fan-in of every node as two lists indexed by
+    node id, the fan-out is the number of distinct routines a routine calls
+    and the fan-in the number of distinct routines that call it
+    """
+    n = len(graph)
+    if ((numpy is not None) and (n > 0)):
+        offsets = numpy.frombuffer(graph.offsets, dtype=numpy.intc)
+        targets = numpy.frombuffer(graph.targets, dtype=numpy.intc)
+        fan_out = numpy.diff(offsets)
+        fan_in = numpy.bincount(targets, minlength=n)
+        return fan_out.tolist(), fan_in.tolist()
+
+    offsets = graph.offsets
+    fan_out = [offsets[u+1] - offsets[u] for u in range(n)]
+    fan_in = [0]*n
+    for v in graph.targets:
+        fan_in[v] += 1
+    return fan_out, fan_in
+
+def ComponentEdges(graph):
+    """
+    Return the edges of the condensation of the graph as two lists, the caller
+    and the callee component of every distinct edge between two components.
+    The edges are sorted by caller, then by callee. Components are numbered in
+    reverse topological order, so the callee is always the lower index
+    """
+    n = len(graph)
+    ncomp = graph.ncomponents()
+    if ((numpy is not None) and (n > 0) and (len(graph.targets) > 0)):
+        offsets = numpy.frombuffer(graph.offsets, dtype=numpy.intc)
+        targets = numpy.frombuffer(graph.targets, dtype=numpy.intc)
+        comp = numpy.frombuffer(graph.components(), dtype=numpy.intc)
+        callers = numpy.repeat(numpy.arange(n), numpy.diff(offsets))
+        cu = comp[callers].astype(numpy.int64)
+        cv = comp[targets].astype(numpy.int64)
+        keep = (cu != cv)
+        pairs = numpy.unique(cu[keep]*ncomp + cv[keep])
+        return (pairs // ncomp).tolist(), (pairs % ncomp).tolist()
+
+    comp = graph.components()
+    pairs = set()
+    for u in range(n):
+        a = comp[u]
+        for v in graph.successors(u):
+            b = comp[v]
+            if (a != b):
+                pairs.add((a, b))
+    pairs = sorted(pairs)
+    return [p[0] for p in pairs], [p[1] for p in pairs]
+
+def PathCounts(ncomp, cu, cv, sources):
+    """
+    Count the calling paths over the condensation of the graph
+
+    Args
+    ----
+    ncomp : int
+        Number of components
+    cu, cv : list
+        The edges between components sorted by caller, see ComponentEdges
+    sources : list
+        The components where the paths begin
+
+    Returns
+    -------
+    up : list
+        Number of paths from the sources to each component, 0 if it is not
+        reached, 1 for a source that is not called by another source. Exact
+        integers, the counts can be far beyond the range of a float
+    down : list
+        Number of paths from each component to a component that calls nothing,
+        exact integers as well
+    height : list
+        Number of calls along the longest path below each component
+    """
+    # the edges of each caller are cu[lo[c]:lo[c+1]]
+    lo = [0]*(ncomp+1)
+    for a in cu:
+        lo[a+1] += 1
+    for c in range(ncomp):
+        lo[c+1] += lo[c]
+
+    # callees have lower indices, so a forward pass sees them first
+    down = [1]*ncomp
+    height = [0]*ncomp
+    for c in range(ncomp):
+        if (lo[c] == lo[c+1]): continue
+        total = 0
+        tallest = 0
+        for i in range(lo[c], lo[c+1]):
+            b = cv[i]
+            total += down[b]
+            if (height[b] > tallest): tallest = height[b]
+        down[c] = total
+        height[c] = tallest + 1
+
+    # callers have higher indices, so a backward pass sees them first
+    up = [0]*ncomp
+    for c in sources:
+        up[c] = 1
+    for c in range(ncomp-1, -1, -1):
+        if (up[c] == 0): continue
+        for i in range(lo[c], lo[c+1]):
+            up[cv[i]] += up[c]
+    return up, down, height
+
+def Depths(graph, roots):
+    """
+    Return the shortest calling distance from the nearest root to every node,
+    -1 for the nodes that are not reached, in a single breadth first search
+    """
+    depth = [-1]*len(graph)
+    queue = deque()
+    for u in roots:
+        if (depth[u] < 0):
+            depth[u] = 0
+            queue.append(u)
+    while (len(queue) > 0):
+        u = queue.popleft()
+        d = depth[u] + 1
+        for v in graph.successors(u):
+            if (depth[v] < 0):
+                depth[v] = d
+                queue.append(v)
+    return depth
+
+def Distribution(values, names, label, top):
+    """
+    Summarize a list of values, one per node: the extremes, the mean, the
+    percentiles, a histogram in powers of two and the nodes with the highest
+    values
+    """
+    n = len(values)
+    ordered = sorted(values)
+    def percentile(p): # nearest rank
+        return ordered[max(0, -(-p*n // 100) - 1)]
+    histogram = OrderedDict() # "0", "1", "2-3", "4-7", ...
+    for v in ordered:
+        if (v < 2):
+            key = str(v)
+        else:
+            low = 1 << (v.bit_length() - 1)
+            key = "{}-{}".format(low, 2*low - 1)
+        histogram[key] = histogram.get(key, 0) + 1
+    best = sorted(range(n), key=lambda u: values[u], reverse=True)[:top]
+    summary = OrderedDict()
+    if (n == 0):
+        return summary
+    summary["min"]    = ordered[0]
+    summary["max"]    = ordered[-1]
+    summary["mean"]   = float(sum(ordered))/n
+    summary["median"] = percentile(50)
+    summary["p90"]    = percentile(90)
+    summary["p99"]    = percentile(99)
+    summary["histogram"] = histogram
+    summary["top"] = [OrderedDict([("routine", label(names[u])), ("value", values[u])])
+                      for u in best]
+    return summary
+
+def Write(report, filename):
+    """
+    Save the report as JSON
+    """
+    with open(filename, "w") as mf:
+        json.dump(report, mf, indent=2)
+
+def Summary(report):
+    """
+    Print the highlights of the report
+    """
+    print("\nCall graph statistics")
+    print("\t{routines} routines, {calls} unique calls, {call_sites} call sites".format(**report))
+    for key in ["fan_out", "fan_in"]:
+        d = report[key]
+        if (len(d) == 0): continue
+        print("\t{:<8} mean {:.2f}, median {}, p90 {}, p99 {}, max {} ({})".format(key, d["mean"],
+              d["median"], d["p90"], d["p99"], d["max"], d["top"][0]["routine"]))
+    c = report["components"]
+    print("\t{} recursive cycles holding {} routines".format(c["recursive"], c["in_cycles"]))
+    d = report["depth"]
+    if (d["max"] is not None):
+        print("\tdepth below the roots: mean {:.2f}, max {}, {} routines not reached".format(
+              d["mean"], d["max"], d["unreached"]))
+    for h in report["hubs"]["top"][:5]:
+        print("\thub {} on {:.1%} of the calling paths".format(h["routine"], h["score"]))
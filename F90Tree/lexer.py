@@ -0,0 +1,551 @@
+"""
+Precompiled regular expressions used to classify Fortran statements
+
+All patterns are compiled once at import and expect lower case text. A single
+anchored alternation classifies each statement in one regex pass, the name of
+the outer group that matched is the statement kind.
+
+Examples
+--------
+>>> classify("  end subroutine setup\\n")
+('end', 'subroutine')
+>>> classify("real(kind=8) function norm(a)\\n")
+('function', 'norm')
+>>> classify("a(1) = norm(a)\\n")
+(None, None)
+"""
+import re
+import mmap
+
+# pretty much any fortran acceptable variable name
+#    [a-z_] is any letter plus the underscore
+#    [a-z_0-9] is any letter, number, or underscore
+#    the following "+" results in 1 or more repetitions of what came before it
+NAME = r"[a-z_][a-z_0-9]+"
+
+# one alternative per statement kind, each alternative is wrapped in a named
+# group with the kind as its name and holds exactly one inner group with the
+# name of the thing being defined. The alternatives are tried in order, so the
+# "end" statements must come before the definitions
+STATEMENT = re.compile(r"""
+    \s*(?:
+      (?P<end>end
+          (?:\s*$
+            |\s*(?P<endkind>program|module|interface|function|subroutine|type)\b.*$))
+    | (?P<program>program\s+(?P<program_name>{name}))
+    | (?P<procedure>(?:module\s+)?procedure(?:\s*::\s*|\s+)
+          (?P<procedure_name>{name}(?:\s*,\s*{name})*))
+    | (?P<module>module\s+(?P<module_name>{name})\s*$)
+    | (?P<interface>(?:abstract\s+)?interface
+          (?:\s+(?P<interface_name>{name}
+                |operator\s*\(\s*[^)\s]+\s*\)
+                |assignment\s*\(\s*=\s*\)))?\s*$)
+    | (?P<use>use\b\s*(?:,\s*(?:non_)?intrinsic\s*)?(?:::)?\s*
+          (?P<use_name>{name}.*))
+    | (?P<type>type\b(?:\s*,.*?::|\s*::|\s+)\s*(?P<type_name>{name})\s*$)
+    | (?P<public>public\b\s*(?:::\s*)?(?P<public_name>[a-z_].*)?$)
+    | (?P<private>private\b\s*(?:::\s*)?(?P<private_name>[a-z_].*)?$)
+    | (?P<subroutine>(?:(?:recursive|pure|impure|elemental|module)\s+)*
+          subroutine\s+(?P<subroutine_name>{name}))
+    | (?P<function>(?:[a-z0-9_(),=*:\s]*?\s)?
+          function\s+(?P<function_name>{name}))
+    )""".format(name=NAME), re.VERBOSE|re.DOTALL)
+
+# the statement kinds and the group holding the name for each kind
+KINDS = {"end"              : "endkind",
+         "program"          : "program_name",
+         "procedure"        : "procedure_name",
+         "module"           : "module_name",
+         "interface"        : "interface_name",
+         "use"              : "use_name",
+         "type"             : "type_name",
+         "public"           : "public_name",
+         "private"          : "private_name",
+         "subroutine"       : "subroutine_name",
+         "function"         : "function_name"}
+
+# call candidates: "call name(" or a bare "call name" is definitely a subroutine
+# call, "name(" could be a function call or an array operation. group 2 is
+# empty for a call without an argument list
+SUBROUTINE_CALL = re.compile(r"\bcall\s+({name})\s*(\(|$)".format(name=NAME))
+SOME_CALL       = re.compile(r"({name})\s*\(".format(name=NAME))
+
+# statement keywords that are followed by a parenthesis, never calls
+KEYWORDS = frozenset(["if", "while", "case", "select", "where", "forall", "print",
+                      "write", "read", "open", "close", "inquire", "rewind", "backspace",
+                      "endfile", "flush", "wait", "allocate", "deallocate", "nullify",
+                      "format", "stop", "go", "goto", "to", "then", "elseif", "elsewhere",
+                      "intent", "dimension", "result", "bind", "is", "default",
+                      "associate", "block", "sync", "concurrent"])
+
+# string literals, removed before looking for call candidates
+STRING = re.compile(r"'[^']*'|\"[^\"]*\"")
+
+# the start of a type declaration statement or of an attribute statement that
+# declares arrays, e.g., "real(kind=8), dimension(3) :: a" or "dimension b(3)".
+# A "type(" or "class(" declaration is told apart from "type is (" by the
+# parenthesis that must follow right away
+# the first word of every such statement, a cheap test before the regex
+DECLARATION_STARTS = ("integer", "real", "logical", "complex", "character", "double",
+                       "type", "class", "dimension", "allocatable", "pointer", "target")
+_DECLARATION = re.compile(r"""(?:
+      (?P<type>integer|real|logical|complex|character|double\s*precision
+              |double\s*complex|type(?=\s*\()|class(?=\s*\())\b
+    | (?P<attribute>dimension|allocatable|pointer|target)\b)\s*""", re.VERBOSE)
+
+_ENTITY = re.compile(r"\s*([a-z_][a-z_0-9]*)\s*(\()?")
+
+# user defined operators, e.g., "a .cross. b", the intrinsic operators and the
+# logical constants are not candidates
+DEFINED_OPERATOR    = re.compile(r"\.([a-z][a-z_]*)\.")
+INTRINSIC_OPERATORS = frozenset(["and", "or", "not", "eqv", "neqv", "eq", "ne",
+                                 "lt", "le", "gt", "ge", "true", "false"])
+
+def classify(line):
+    """
+    Classify a single lower case statement
+
+    Args
+    ----
+    line : str
+        The statement to classify
+
+    Returns
+    -------
+    kind : str
+        One of "end", "program", "procedure", "module", "interface", "use",
+        "type", "public", "private", "subroutine", "function", or None if the
+        statement does not start or end a program unit or a derived type and
+        is not a use, procedure or access statement
+    name : str
+        The name of the program unit. For "end" statements this is the kind of
+        unit that ends, or None for a bare "end". For "interface" this is None
+        if the interface is not generic, otherwise the generic name or the
+        operator, e.g., "operator(.cross.)" or "assignment(=)". For "procedure"
+        this is the comma separated list of procedure names and for "use" this
+        is the rest of the statement, starting with the module name. For
+        "public" and "private" this is the comma separated list of names, or
+        None if the statement sets the default accessibility
+    """
+    m = STATEMENT.match(line)
+    if (m is None):
+        return None, None
+    kind = m.lastgroup
+    name = m.group(KINDS[kind])
+    if ((kind == "interface") and (name is not None)):
+        name = "".join(name.split()) # "operator ( + )" --> "operator(+)"
+    return kind, name
+
+def DeclaredArrays(statement):
+    """
+    Return the arrays declared by a type declaration or attribute statement
+
+    Args
+    ----
+    statement : str
+        A lower case statement without leading blanks
+
+    Returns
+    -------
+    arrays : list
+        The names of the entities that are declared with an array shape or
+        the dimension attribute, None if the statement is not a declaration
+
+    Examples
+    --------
+    >>> DeclaredArrays("real(kind=8) :: cross_r(3), norm")
+    ['cross_r']
+    >>> DeclaredArrays("integer, dimension(n) :: idx")
+    ['idx']
+    >>> DeclaredArrays("x = norm(a)") is None
+    True
+    """
+    if (not statement.startswith(DECLARATION_STARTS)): # cheap test of most statements
+        return None
+    m = _DECLARATION.match(statement)
+    if (m is None):
+        return None
+    rest = statement[m.end():]
+    dimension = (m.group("attribute") == "dimension")
+    if (m.group("type") is not None):
+        # the kind or length, "(kind=8)", "*8" or "*(*)"
+        if (rest.startswith("(")):
+            rest = rest[_closing(rest)+1:]
+        elif (rest.startswith("*")):
+            rest = rest[1:].lstrip()
+            if (rest.startswith("(")):
+                rest = rest[_closing(rest)+1:]
+            else:
+                rest = rest.lstrip("0123456789")
+    if ("::" in rest):
+        attributes, rest = rest.split("::", 1)
+        dimension = dimension or ("dimension" in attributes)
+    elif (rest.lstrip().startswith(",")): # an attribute list needs the "::"
+        return None
+
+    arrays = []
+    for entity in _split_commas(rest):
+        e = _ENTITY.match(entity)
+        if (e is None):
+            return None # not a declaration after all, e.g., "real = 1"
+        shape = (e.group(2) is not None)
+        rest = entity[e.end():]
+        if (shape):
+            rest = entity[e.start(2):]
+            rest = rest[_closing(rest)+1:]
+        if (rest.strip()[:1] not in ["", "=", "*"]): # initialization or length
+            return None
+        if (dimension or shape):
+            arrays.append(e.group(1))
+    return arrays
+
+def _closing(text):
+    """
+    Return the index of the parenthesis that closes the one at the start of
+    the text, the end of the text if it is not closed
+    """
+    depth = 0
+    for i, c in enumerate(text):
+        if (c == "("):
+            depth += 1
+        elif (c == ")"):
+            depth -= 1
+            if (depth == 0):
+                return i
+    return len(text)
+
+def _split_commas(text):
+    """
+    Split a list on the commas that are not inside of parentheses
+    """
+    items = []
+    depth = 0
+    start = 0
+    for i, c in enumerate(text):
+        if (c in "(["):
+            depth += 1
+        elif (c in ")]"):
+            depth -= 1
+        elif ((c == ",") and (depth == 0)):
+            items.append(text[start:i])
+            start = i+1
+    items.append(text[start:])
+    return items
+
+def OperatorName(op):
+    """
+    Return the generic name of a user defined operator, e.g., "operator(.cross.)"
+    """
+    return "operator(.{}.)".format(op)
+
+_USE = re.compile(r"({name})\s*(?:,\s*(only\s*:)?\s*(.*))?$".format(name=NAME), re.DOTALL)
+
+def ParseUse(text):
+    """
+    Parse the text of a use statement, starting at the module name
+
+    Args
+    ----
+    text : str
+        The use statement without the leading "use", see classify
+
+    Returns
+    -------
+    module : str
+        The name of the module
+    only : set
+        The local names listed in the "only:" list, None if there is no list
+    renames : dict
+        Dictionary holding local_name:module_name pairs for every rename
+
+    Examples
+    --------
+    >>> module, only, renames = ParseUse("utils, only: setup, go => run")
+    >>> module, sorted(only), renames
+    ('utils', ['go', 'setup'], {'go': 'run'})
+    """
+    m = _USE.match(text.strip())
+    if (m is None):
+        return None, None, {}
+    module = m.group(1)
+    only = set() if (m.group(2) is not None) else None
+    renames = {}
+    items = m.group(3) or ""
+    for item in items.split(","):
+        item = item.strip()
+        if (item == ""): continue
+        if (item.startswith(("operator", "assignment"))):
+            item = "".join(item.split())
+        if ("=>" in item):
+            local, remote = [x.strip() for x in item.split("=>", 1)]
+            renames[local] = remote
+            item = local
+        if (only is not None):
+            only.add(item)
+    return module, only, renames
+
+# file extensions that hold fixed form source code, everything else is free form
+FIXED_FORM_EXTENSIONS = (".f", ".for", ".ftn", ".f77")
+
+# pieces of a line: a quoted string (possibly unterminated), a comment, a
+# statement separator, or a run of anything else
+_PIECE = re.compile(r"""'[^']*'?|"[^"]*"?|!.*|;|[^'"!;]+""", re.DOTALL)
+
+def IsFixedForm(filename):
+    """
+    Return True if the extension of the given file indicates fixed form source
+    """
+    return filename.lower().endswith(FIXED_FORM_EXTENSIONS)
+
+def Statements(lines, fixed_form=False):
+    """
+    Generate the logical statements of a Fortran source file
+
+    Continuation lines are joined, lines are split on ";", comments are
+    removed without touching "!" or ";" inside of string literals, and empty
+    statements, comment lines and preprocessor lines are skipped.
+
+    Args
+    ----
+    lines : iterable
+        The physical lines of the source, e.g., an open file object
+    fixed_form : bool, optional
+        Use the fixed form column rules instead of the free form rules
+
+    Returns
+    -------
+    statements : generator
+        Generates (lineno, statement) tuples, where lineno is the line number
+        of the first line of the statement and the statement is lower case
+    """
+    if (fixed_form):
+        return _fixed_form(enumerate(lines, 1))
+    return _free_form(enumerate(lines, 1))
+
+# the code lines of a memory mapped file: lines that are neither blank nor a
+# comment, the comment and blank regions are skipped inside the regex engine
+_FREE_CODE  = re.compile(br"^[ \t]*[^!\s][^\n]*", re.M)
+_FIXED_CODE = re.compile(br"^[^cC*!#\r\n][^\n]*", re.M)
+
+# the free form code lines that may hold a definition, a use, an access
+# statement, a call or a defined operator, see classify, SOME_CALL and
+# DEFINED_OPERATOR, or that may be continued. A function statement always has
+# parentheses, the other definitions and a call without an argument list start
+# with a keyword, e.g., "call finalize_all", so the keywords are only tried at
+# the start of a line, after an optional statement label, e.g., "10 call leaf".
+# Every other line is skipped inside the regex engine
+_FREE_RELEVANT = re.compile(br"""^[ \t]*(?=[^!\s])
+    (?:(?:\d+[ \t]+)?
+       (?:end|program|procedure|module|interface|abstract|use|type|public|private
+         |subroutine|recursive|pure|impure|elemental|call)
+      |[^(&;\n]*[(&;]
+      |[^\n]*?\.[a-z_]+\.)[^\n]*""", re.M|re.I|re.X)
+
+if (str is bytes): # python 2, the lines stay byte strings like the text mode
+    _decode = lambda b: b
+else:
+    _decode = lambda b: b.decode("latin-1")
+
+def MappedStatements(filename, fixed_form=False):
+    """
+    Generate the logical statements of a Fortran source file, memory mapped
+
+    The same statements as Statements are generated, but the file is memory
+    mapped and searched as bytes. Blank and comment lines are skipped without
+    creating a string for them and, in free form, so are the lines that can
+    not hold a definition or a call, e.g., "x = y + 1.0". Only the remaining
+    lines are decoded. Worth it for large files with many such lines.
+
+    Args
+    ----
+    filename : str
+        The Fortran source file
+    fixed_form : bool, optional
+        Use the fixed form column rules instead of the free form rules
+
+    Returns
+    -------
+    statements : generator
+        Generates (lineno, statement) tuples, see Statements
+    """
+    with open(filename, "rb") as mf:
+        try:
+            mm = mmap.mmap(mf.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError: # an empty file can not be mapped
+            return
+        try:
+            if (fixed_form): # a continuation is only marked on the next line
+                lines = _mapped_lines(mm, _FIXED_CODE, _FIXED_CODE)
+                for statement in _fixed_form(lines):
+                    yield statement
+            else:
+                lines = _mapped_lines(mm, _FREE_RELEVANT, _FREE_CODE)
+                for statement in _free_form(lines):
+                    yield statement
+        finally:
+            mm.close()
+
+def _mapped_lines(mm, relevant, code):
+    """
+    Generate the (lineno, line) pairs of the relevant lines of a memory mapped
+    file, every code line after a line holding a "&" is kept as well since it
+    may continue a statement
+    """
+    lineno = 1
+    pos = 0 # the end of the previous line
+    m = relevant.search(mm)
+    while (m is not None):
+        s, e = m.span()
+        lineno += mm[pos:s].count(b"\n")
+        pos = e
+        line = mm[s:e]
+        yield lineno, _decode(line)
+        if (b"&" in line):
+            m = code.search(mm, pos)
+        else:
+            m = relevant.search(mm, pos)
+
+# the label of a free form statement, only on the first line of the statement
+_LABEL = re.compile(r"\d{1,5}[ \t]+")
+
+def _free_form(lines):
+    """
+    The statements of free form source, lines are (lineno, line) pairs. The
+    statement labels are removed
+    """
+    buf   = []   # pieces of the current statement
+    start = 0    # line number where the current statement started
+    quote = None # the open quote character if a string is continued
+
+    for lineno, raw in lines:
+        line = raw.lower().strip()
+
+        if (len(buf) == 0):
+            if ((line == "") or (line[0] in "!#")): continue # comments & preprocessor
+            start = lineno
+            if (line[0].isdigit()):
+                label = _LABEL.match(line)
+                if (label is not None):
+                    line = line[label.end():]
+        else:
+            if (line == "") or (line[0] == "!"): continue # comment between continuations
+            if (line[0] == "&"):
+                line = line[1:]
+
+        statements, partial, quote = _split(line, quote)
+        for s in statements:
+            buf.append(s)
+            statement = "".join(buf).strip()
+            if (statement != ""):
+                yield start, statement
+            buf = []
+            start = lineno
+
+        if (partial.endswith("&")): # continued on the next line
+            buf.append(partial[:-1])
+        else:
+            buf.append(partial)
+            statement = "".join(buf).strip()
+            if (statement != ""):
+                yield start, statement
+            buf = []
+            quote = None
+
+    statement = "".join(buf).strip()
+    if (statement != ""):
+        yield start, statement
+
+def _fixed_form(lines):
+    """
+    The statements of fixed form source, lines are (lineno, line) pairs
+    """
+    buf   = []   # pieces of the current statement
+    start = 0    # line number where the current statement started
+    quote = None # the open quote character if a string is continued
+
+    for lineno, raw in lines:
+        line = raw.lower().rstrip("\r\n")
+        if ((line == "") or (line[0] in "c*!#")): continue # comments & preprocessor
+
+        tab = line.find("\t", 0, 6)
+        if (tab >= 0): # tab format, a digit after the tab is a continuation
+            code = line[tab+1:]
+            continued = (code[:1] != "") and (code[:1] in "123456789")
+            if (continued):
+                code = code[1:]
+        else:
+            line = line[:72] # columns 73 and up are ignored
+            continued = (len(line) > 5) and (line[5] not in " 0")
+            code = line[6:]
+        if (code.strip() == "") or (code.lstrip()[0] == "!"): continue
+
+        if (not continued):
+            statement = "".join(buf).strip()
+            if (statement != ""):
+                yield start, statement
+            buf = []
+            quote = None
+            start = lineno
+
+        statements, partial, quote = _split(code, quote)
+        for s in statements:
+            buf.append(s)
+            statement = "".join(buf).strip()
+            if (statement != ""):
+                yield start, statement
+            buf = []
+        buf.append(partial)
+
+    statement = "".join(buf).strip()
+    if (statement != ""):
+        yield start, statement
+
+def _split(line, quote):
+    """
+    Split a line on ";" and remove any trailing comment, respecting strings
+
+    Args
+    ----
+    line : str
+        The source line
+    quote : str
+        The open quote character if the line continues a string, else None
+
+    Returns
+    -------
+    statements : list
+        The complete statements that were terminated by a ";"
+    partial : str
+        The text after the last ";", it may continue on the next line
+    quote : str
+        The open quote character if a string continues on the next line
+    """
+    prefix = ""
+    if (quote is not None): # finish the string that was continued
+        i = line.find(quote)
+        if (i < 0):
+            return [], line, quote
+        prefix = line[:i+1]
+        line = line[i+1:]
+        quote = None
+
+    # fast path: nothing that needs to be tokenized
+    if not (("!" in line) or (";" in line) or ("'" in line) or ('"' in line)):
+        return [], prefix + line, None
+
+    statements = []
+    current = [prefix]
+    for m in _PIECE.finditer(line):
+        piece = m.group(0)
+        c = piece[0]
+        if (c == "!"): # trailing comment
+            break
+        elif (c == ";"):
+            statements.append("".join(current))
+            current = []
+        else:
+            if (c in "'\"") and ((len(piece) == 1) or (piece[-1] != c)):
+                quote = c # unterminated string, continued on the next line
+            current.append(piece)
+
+    return statements, "".join(current).rstrip(), quote
@@ -2,14 +2,15 @@
 Parse the files to determine the calling tree
 """
 from __future__ import print_function
-from utilities import treewalk
-from parsers import FindDefinitions, ParseFile
-from collections import OrderedDict
-import numpy as np
-import sys
-
-def Parse(directory, include_ext=[], exclude_dirs=[], ignore=[],
-          verbose=False, output=None, rec_limit=None):
+from utilities import iterwalk, Mean, Median, CompileRoutinePatterns
+from parsers import ScanFiles
+from graph import CallGraph
+from symbols import SymbolTable
+
+def Parse(directory, include_ext=[], exclude_dirs=[], ignore=[], roots=None,
+          verbose=False, output=None, fmt=None, jobs=1, cache_dir=None, use_hash=False,
+          include=[], exclude=[], walkers=1, profile=None, mapped=None, max_depth=None,
+          prune=[], collapse=True, start=0, limit=None, stats=None):
     """
     Parse the source tree to get the calling tree
 
@@ -18,23 +19,93 @@ def Parse(directory, include_ext=[], exclude_dirs=[], ignore=[],
     directory : str
         Path to the directory that holds the source code
     include_ext : list, optional
-        List of valid file extensions, ".f90" is equivalent to "f90"
+        List of valid file extensions, ".f90", "F90" and "f90" are equivalent
+        and "fortran" stands for all Fortran extensions
     exclude_dirs : list, optional
-        List of directories to exclude, e.g., "build" or "tmp"
+        List of directories to exclude, e.g., "build", "src/*/tmp" or a regular
+        expression such as "re:^old_", see utilities.CompilePatterns
     ignore : list, optional
         List of routine names to exclude, e.g., user defined print/write functions
+    roots : list, optional
+        List of routine names or ids where the calling trees begin, "programs"
+        stands for all programs and "public" for all public module procedures.
+        Defaults to all programs, or to the public module procedures if the
+        source tree does not hold a program, e.g., a library
     verbose : bool, optional
         Print more status information to the screen
     output : str, optional
         Write the resulting tree to the given filename
-    rec_limit : int, optional
-        Set the recursion depth limit
+    fmt : str, optional
+        Format of the output file, one of "text", "jsonl", "dot", "graphml" or
+        "adjacency". It is guessed from the filename extension if not given
+    jobs : int, optional
+        Number of processes used to scan the files
+    cache_dir : str, optional
+        Keep the scan results of every file in a cache under this directory,
+        unchanged files are not scanned again on the next run
+    use_hash : bool, optional
+        Validate the cache entries using a hash of the file contents
+    include : list, optional
+        List of file patterns, only the files that match one of them are parsed
+    exclude : list, optional
+        List of file patterns to skip, e.g., "*_test.f90"
+    walkers : int, optional
+        Number of threads that walk the directory tree
+    profile : Profiler, optional
+        Time the phases of the run and the scan of every file, see
+        profiling.Profiler. Nothing is measured if not given
+    mapped : bool, optional
+        Memory map every file, or none, see parsers.ScanFile. By default only
+        the large files are mapped
+    max_depth : int, optional
+        Do not expand the calling trees below this depth
+    prune : list, optional
+        List of routine or module patterns, e.g., "mpi_*", "timers" or
+        "re:^io::", the matching routines are left out of the summary and the
+        output together with the calls they make, see
+        utilities.CompileRoutinePatterns. Unlike ignore, a pruned routine is
+        still resolved, it is only not shown
+    collapse : bool, optional
+        Write a subtree that was already written as a single "(see above)"
+        line, if False every subtree is written in full
+    start, limit : int, optional
+        Write at most limit nodes of the calling trees, starting with node
+        number start, the trees are only expanded as far as they are written
+    stats : str, optional
+        Compute the fan-in and fan-out distributions, the depths, the cycles
+        and the hub routines of the call graph, print the highlights and save
+        them as JSON to the given filename, see graphstats.Statistics
+    """
+    render = {"max_depth":max_depth, "prune":CompileRoutinePatterns(prune),
+              "collapse":collapse, "start":start, "limit":limit}
+    if (profile is None):
+        return _parse(directory, include_ext, exclude_dirs, ignore, roots, verbose, output,
+                      fmt, jobs, cache_dir, use_hash, include, exclude, walkers, None,
+                      mapped, render, stats)
+    profile.start()
+    try:
+        return _parse(directory, include_ext, exclude_dirs, ignore, roots, verbose, output,
+                      fmt, jobs, cache_dir, use_hash, include, exclude, walkers, profile,
+                      mapped, render, stats)
+    finally:
+        profile.stop()
+
+def _parse(directory, include_ext, exclude_dirs, ignore, roots, verbose, output, fmt, jobs,
+           cache_dir, use_hash, include, exclude, walkers, profile, mapped, render, stats):
+    """
+    The body of Parse, see Parse for the arguments, render holds the keyword
+    arguments of the writer, see writers.Writer
     """
 
-    if (rec_limit is not None):
-        print("\n\nWARNING: old recursion depth limit = {}, restting it to = {}\n".format(
-              sys.getrecursionlimit(), rec_limit))
-        sys.setrecursionlimit(int(rec_limit))
+    # the writers and the cache are only imported when they are used, which
+    # keeps the startup of short runs fast
+    if (output is not None):
+        from writers import GetWriter, WRITERS
+        writer = GetWriter(fmt, output)
+        if (writer is None):
+            print("\nERROR: unknown output format = {}, expected one of {}\n".format(
+                  fmt, ", ".join(sorted(WRITERS.keys()))))
+            return
 
     print("\nFinding Fortran files under : {}".format(directory))
     if (len(include_ext) > 0):
@@ -45,143 +116,191 @@ def Parse(directory, include_ext=[], exclude_dirs=[], ignore=[],
         print("\n\texcluding directories:")
         for d in exclude_dirs:
             print("\t\t{}".format(d))
+    if (len(include) > 0):
+        print("\n\tincluding files:")
+        for d in include:
+            print("\t\t{}".format(d))
+    if (len(exclude) > 0):
+        print("\n\texcluding files:")
+        for d in exclude:
+            print("\t\t{}".format(d))
     if (len(ignore) > 0):
         print("\n\texcluding some routines:")
         for d in ignore:
             print("\t\t{}".format(d))
-    files = treewalk(directory, include_ext=include_ext, exclude_dirs=exclude_dirs)
+    functions   = [] # list of all function names
+    subroutines = [] # list of all subroutine names
+    interfaces  = {} # dictionary holding interface_id:[specific routines] pairs
+    funcnames   = {} # dictionary holding filename:[routine_names] pairs
+    table = SymbolTable() # scoped symbol table, maps each routine_id to its scope
+
+    # read each file exactly once to get the definitions and the raw call
+    # candidates. The files are scanned while the tree is still being walked
+    print("\nFinding all user-defined function/subroutine definitions and calls...")
+    if (cache_dir is not None):
+        from cache import ParseCache
+        cache = ParseCache(cache_dir, use_hash=use_hash)
+    else:
+        cache = None
+    files = []
+    def walk():
+        walker = iterwalk(directory, include_ext=include_ext, exclude_dirs=exclude_dirs,
+                          include=include, exclude=exclude, threads=walkers)
+        if (profile is not None): # the walk overlaps the scan
+            walker = profile.timed("walk", walker)
+        for f in walker:
+            files.append(f)
+            yield f
+    scans = ScanFiles(walk(), jobs=jobs, verbose=verbose, cache=cache, profile=profile,
+                      mapped=mapped)
 
     if (len(files) < 1):
         print("\nERROR: found no matching files in {}\n".format(directory))
+        if (cache is not None):
+            cache.close()
         return
     print("\t\nFound {} files".format(len(files)))
 
-    main_program_name = None
-    main_program_file = None
-    has_main          = False
-    main              = None
-    functions   = [] # list of all function names
-    subroutines = [] # list of all subroutine names
-    interfaces  = {} # dictionary holding interface_name:[specific routines] pairs
-    filenames   = {} # dictionary holding routine_name:filename pairs
-    funcnames   = {} # dictionary holding filename:[routine_names] pairs
-    calls       = {} # dictionary holding routine_name:[list of routine calls]
-                     # where each value is actually a list of [name, calltype]
-    numcalls    = {} # dictionary holding routine_name:number_of_calls
-    filecalls   = {} # dictionary holding filename:dict("calls":calls, "ncalls":numcalls)
-
-    # get global list of functions/subroutines/interfaces
-    print("\nFinding all user-defined function/subroutine definitions...")
-    for f in files:
-        fnames, snames, ints, defs, has_main, main = FindDefinitions(f, verbose=verbose)
-        functions += fnames
-        subroutines += snames
-        interfaces.update(ints)
-        filenames.update(defs)
-        funcnames[f] = fnames
-        if (has_main):
-            main_program_name = main
-            main_program_file = f
+    # the order of the walk is not defined when several threads walk the tree,
+    # the scans are sorted so the output only depends on the tree
+    scans.sort(key=lambda s: s.filename)
+    if (cache is not None):
+        print("\n\tServed {} files from the cache, scanned {}".format(cache.hits,
+              len(files)-cache.hits))
+        cache.prune(files)
+        cache.close()
+    if (profile is not None):
+        profile.count("files", len(files))
+        profile.lap("scan")
+    for scan in scans:
+        f = scan.filename
+        functions += scan.funcnames
+        subroutines += scan.subnames
+        funcnames[f] = scan.funcnames
+        table.add_scan(scan)
+
+    for k in table.procedures():
+        if (table.scopes[k].kind == "interface"):
+            interfaces[k] = table.scopes[k].specifics
 
     print("\n\tFound {} functions".format(len(functions)))
     print(  "\tFound {} subroutines".format(len(subroutines)))
     print(  "\tFound {} interfaces".format(len(interfaces.keys())))
 
-    # only function/subroutine/interface calls that are considered valid
-    # will be added to the "calls" and "numcalls" dictionaries
-    valid_routine_names = functions + list(interfaces.keys()) + subroutines
-
-    # remove the ignored names
+    # remove the ignored names, either bare names or ids such as "module::name"
     for name in ignore:
-        if (name in valid_routine_names):
-            valid_routine_names.remove(name)
+        table.ignore(name)
+    if (profile is not None):
+        profile.lap("define")
+
+    # resolve the call candidates of each file through the symbol table, in
+    # memory. Only calls to known, non-ignored routines are kept. The calls of
+    # each file are handed straight to the call graph, which keeps them as
+    # integer arrays, so the resolved calls of the whole tree are never held
+    # as python lists
+    print("\nResolving calls to functions/subroutines...")
+    def resolved_calls():
+        for scan in scans:
+            c = scan.resolve_scopes(table)
+            for k in c.keys():
+                yield k, c[k]
 
-    # re-read each file to get what calls each function/subroutine makes
-    print("\nFinding calls to functions/subroutines...")
-    for f in files:
-        c, n = ParseFile(f, valid_routine_names, verbose=verbose)
-        filecalls[f] = {"calls":c, "ncalls":n}
-        calls.update(c)
-        numcalls.update(n)
+        # a call to a generic interface can dispatch to any of its specific
+        # procedures. The specifics are resolved once per interface and shared
+        # by every call site
+        for k in interfaces.keys():
+            if (k in table.ignored): continue
+            yield k, [[sid, "i"] for sid in table.specifics(k)]
 
+    if (profile is None):
+        graph = CallGraph(resolved_calls())
+    else: # the resolution overlaps the graph construction
+        graph = CallGraph(profile.timed("resolve", resolved_calls()))
+        profile.lap("graph")
+        profile.count("routines", len(graph))
+        profile.count("calls", len(graph.targets))
+        profile.count("call_sites", sum(graph.counts))
+        profile.count("graph_bytes", graph.nbytes())
+
+    routines = [k for k in graph.callers() if table.scopes[k].kind != "interface"]
     if (verbose):
-        for k in calls.keys():
-            print("calls by {}:".format(k))
-            for i,j in enumerate(calls[k]):
-                if (j[0] in calls.keys()):
-                    print("\t{}) {}".format(i+1, j[0]))
-                else:
-                    print("\t{}) {}, intrinsic".format(i+1, j[0]))
-
-    v = numcalls.values()
-    avg = np.mean(v)
-    med = np.median(v)
+        for k in routines:
+            print("calls by {}:".format(table.label(k)))
+            for i,(j, ctype, count, lines) in enumerate(graph.sites(k)):
+                kind = ", interface" if (table.scopes[j].kind == "interface") else ""
+                print("\t{}) {}{}, {} call(s) on line(s) {}".format(i+1, table.label(j),
+                      kind, count, ", ".join([str(l) for l in lines])))
+
+    v = [graph.ncalls(k) for k in routines]
+    avg = Mean(v)
+    med = Median(v)
     maximum = 0; maxfunc = ""
-    for k in numcalls.keys():
-        if (numcalls[k] > maximum):
+    for k in routines:
+        if (graph.ncalls(k) > maximum):
             maxfunc = k
-            maximum = numcalls[k]
-    print("\n\tEach routine makes {:.2f} calls on average ({:.2f} median)".format(avg, med))
-    print("\tThe most calls is {}, made by {} in {}".format(maximum, maxfunc,
-                                                   filenames[maxfunc][len(directory):]))
-
-    # add interfaces to the calls/numcalls dictionaries
-    for k in interfaces.keys():
-        calls[k] = []
-        numcalls[k] = 0
+            maximum = graph.ncalls(k)
+    print("\n\tEach routine calls {:.2f} routines on average ({:.2f} median)".format(avg, med))
+    if (maximum > 0): # no routine to name if nothing makes a call
+        print("\tThe most routines called is {}, by {} in {}".format(maximum, table.label(maxfunc),
+                                           table.scopes[maxfunc].filename[len(directory):]))
 
     # build the calling tree
     print("\nBuilding calling tree")
-    call_hist = []; intr_hist = []
-    print("\tmain program calls:")
-    for k in calls[main_program_name]:
-        kcall = k[0]
-        ctype = k[1]
-        hist = GetTree(kcall, calls, numcalls, [])
-        call_hist.append(hist)
-        print("\t  {} calls:".format(kcall))
-        if (numcalls[kcall] > 0):
-            print("\t    {}".format(np.asarray(calls[kcall])[:,0]))
-            print("\t      {}".format(hist))
+    print("\t{} routines and {} unique calls from {} call sites held in {:.1f} kB".format(
+          len(graph), len(graph.targets), sum(graph.counts), graph.nbytes()/1024.))
+    cycles = graph.cycles()
+    if (len(cycles) > 0):
+        print("\tFound {} recursive cycles".format(len(cycles)))
+        if (verbose):
+            for c in cycles:
+                print("\t\t{}".format(", ".join([table.label(m) for m in c])))
+
+    # the routines where the calling trees begin, a subtree that is shared by
+    # several roots is only expanded once
+    if ((roots is None) or (len(roots) == 0)):
+        roots = ["programs"]
+    root_ids = [r for r in table.roots(roots) if r in graph.ids]
+    if ((len(root_ids) == 0) and (roots == ["programs"])):
+        print("\tNo program found, using the public module procedures as roots")
+        root_ids = [r for r in table.roots(["public"]) if r in graph.ids]
+    if (len(root_ids) == 0):
+        print("\nERROR: found no routine matching the roots = {}\n".format(", ".join(roots)))
+        return
+
+    pruned = render["prune"]
+    if (pruned is None):
+        pruned = lambda sid: False
+    for root in root_ids:
+        print("\t{} calls:".format(table.label(root)))
+        for kcall in graph.callees(root):
+            if (pruned(kcall)): continue
+            print("\t  {} calls:".format(table.label(kcall)))
+            if (graph.ncalls(kcall) > 0):
+                print("\t    {}".format([table.label(c) for c in graph.callees(kcall)
+                                          if not pruned(c)]))
+    # a single search from all roots, a count per callee would walk the shared
+    # subtrees again for every callee
+    reached = graph.nreachable(*root_ids)
+    print("\tthe roots reach {} of {} routines".format(reached, len(graph)))
 
     print()
+    if (profile is not None):
+        profile.count("cycles", len(cycles))
+        profile.lap("summary")
+    if (stats is not None):
+        from graphstats import Statistics, Summary, Write
+        report = Statistics(graph, root_ids, label=table.label)
+        Summary(report)
+        Write(report, stats)
+        print("\nsaved statistics to file = {}\n".format(stats))
+        if (profile is not None):
+            profile.lap("stats")
     if (output is not None): # write results to file
 
         with open(output, 'w') as mf:
-             mf.write("Main Program calls\n")
-             for i,c in enumerate(calls[main_program_name]):
-                 func = c[0]; ctype = c[1]
-                 mf.write("\t{} calls:\n".format(func))
-                 for j in calls[func]:
-                     c1 = j[0]; c2 = j[1]
-                     mf.write("\t\t{}\n".format(c1))
-                     h = GetTree(c1, calls, numcalls, [])
-                     for k,e in enumerate(h):
-                         mf.write("\t\t\t"+k*"\t"+"{}\n".format(e))
-             mf.write("\n")
-             mf.write("Interfaces\n")
-             for k in interfaces.keys():
-                 mf.write("\t{}\n".format(k))
-                 v = interfaces[k]
-                 for i in v:
-                     mf.write("\t\t{}\n".format(i))
+            writer(mf, label=table.label, interfaces=interfaces, **render).write(graph,
+                                                                                 root_ids)
 
         print("saved tree to file = {}\n".format(output))
-
-def GetTree(fkey, calls, ncalls, call_history):
-
-    if (fkey in calls.keys()):
-        if (ncalls[fkey] == 0): # no calls are made
-            return call_history
-
-        for entry in calls[fkey]: # loop over all calls made by fkey
-            newkey = entry[0]
-            call_history.append(newkey) # global call history
-            call_history = GetTree(newkey, calls, ncalls, call_history)
-
-        return call_history
-
-    else:
-        print("ERROR: should never be here... key = \"{}\" was not found".format(fkey))
-        return call_history
-
+        if (profile is not None):
+            profile.lap("output")
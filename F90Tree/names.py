@@ -0,0 +1,74 @@
+"""
+Hash index of the callable routine names used to resolve calls
+"""
+
+class NameIndex(object):
+    """
+    Index of every callable function/subroutine/interface name
+
+    Lookups are hash based, so resolving a call costs the same no matter how
+    many routines are defined. Every name is stored under its case-folded key
+    and, for module procedures, also under the module-qualified key
+    "module::name".
+
+    Args
+    ----
+    names : list, optional
+        Routine names to add to the index
+
+    Examples
+    --------
+    >>> index = NameIndex(["setup"])
+    >>> index.add("norm_r", module="utils")
+    >>> "Setup" in index
+    True
+    >>> index.lookup("UTILS::norm_r")
+    'norm_r'
+    """
+
+    separator = "::"
+
+    def __init__(self, names=[]):
+        self._index = {} # key:canonical name pairs
+        self._keys  = {} # canonical name:set of keys pairs
+        for n in names:
+            self.add(n)
+
+    def add(self, name, module=None):
+        """
+        Add a routine name, with an optional module that holds its definition
+        """
+        keys = self._keys.setdefault(name, set())
+        keys.add(name.lower())
+        if (module is not None):
+            keys.add(self.qualify(module, name))
+        for k in keys:
+            self._index[k] = name
+
+    def lookup(self, name):
+        """
+        Return the canonical routine name for the given key, None if not found
+        """
+        canonical = self._index.get(name)
+        if (canonical is None):
+            canonical = self._index.get(name.lower())
+        return canonical
+
+    def names(self):
+        """
+        Return a frozenset of all canonical routine names
+        """
+        return frozenset(self._keys.keys())
+
+    @classmethod
+    def qualify(cls, module, name):
+        """
+        Return the module-qualified key of the given routine
+        """
+        return (module + cls.separator + name).lower()
+
+    def __contains__(self, name):
+        return (self.lookup(name) is not None)
+
+    def __len__(self):
+        return len(self._keys)
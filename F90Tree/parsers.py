@@ -3,307 +3,590 @@ Define a bunch of classes to help in the parsing process
 """
 from __future__ import print_function
 import os
-import re
 from collections import OrderedDict
+from names import NameIndex
+from lexer import classify, Statements, MappedStatements, IsFixedForm, ParseUse, OperatorName, \
+                  DeclaredArrays, DECLARATION_STARTS, KEYWORDS, SOME_CALL, SUBROUTINE_CALL, STRING, \
+                  DEFINED_OPERATOR, INTRINSIC_OPERATORS
+from symbols import Scope
 
-def FindDefinitions(filename, verbose=False):
-    """
-    Parse a Fortran file for function/subroutine definitions
+# bump this whenever the scanner or the FileScan contents change, any cached
+# scan results written by an older scanner are then thrown away
+SCANNER_VERSION = 12
 
-    Args
-    ----
-    filename : string
-        The filename of the Fortran source code to parse
-    verbose : bool, optional
-        Print more information to screen
+# files of at least this many bytes are memory mapped and scanned as bytes,
+# see lexer.MappedStatements
+MMAP_SIZE = 1 << 20
 
-    Returns
-    -------
+class FileScan(object):
+    """
+    Results of a single pass over a Fortran source file
+
+    Attributes
+    ----------
+    filename : str
+        The filename of the Fortran source code that was scanned
     funcnames : list
-        List of function names that are defined in this file
+        List of function names that are defined in this file, the main program
+        is included in this list
     subnames : list
         List of subroutine names that are defined in this file
     interfaces : dict
         Dictionary holding the interface mappings. The key is the interface
         name and the values are the routines that the interface name could call
-    definitions : dict
-        Dictionary holding the routine mappings. The key is the callable
-        function/subroutine name and the value is the filename that holds
-        its definition
+    programs : list
+        List of all program names that are defined in this file
     contains_main : bool
         Indicates whether or not this file contains the main program
     main_name : str
         The name of the main program if it was found, None if it was not found
+    modules : dict
+        Dictionary holding routine_name:module_name pairs for every routine
+        that is defined inside a module
+    scopes : ordered dict
+        Dictionary holding scope_id:Scope pairs for every module, program,
+        procedure and interface defined in this file, see symbols.Scope
+    candidates : ordered dict
+        Dictionary holding the raw call candidates. The key is the scope id of
+        the routine and the value is a list of [name, calltype, lineno]
+        elements for every possible call made by that routine, before any
+        resolution. The lineno is the first line of the calling statement
+    lines : int
+        Number of lines up to the last statement of the file
     """
 
-    funcnames     = [] # list of function names
-    subnames      = [] # list of subroutine names
-    interfaces    = {} # maps the interface to the possible calling routines
-    definitions   = {} # maps the routine name to the filename
-    contains_main = False
-    main_name     = None
+    def __init__(self, filename):
+        self.filename      = filename
+        self.funcnames     = []
+        self.subnames      = []
+        self.interfaces    = {}
+        self.programs      = []
+        self.contains_main = False
+        self.main_name     = None
+        self.modules       = {}
+        self.scopes        = OrderedDict()
+        self.candidates    = OrderedDict()
+        self.lines         = 0
+
+    def add_scope(self, scope):
+        """
+        Add a scope defined in this file, returns the scope that is stored
+        under its id, i.e., the first one if the same id is defined twice
+        """
+        sid = scope.id
+        if (sid not in self.scopes):
+            self.scopes[sid] = scope
+            if (scope.kind != "module"):
+                self.candidates[sid] = []
+        return self.scopes[sid]
+
+    @property
+    def definitions(self):
+        """
+        Dictionary mapping each function/subroutine name to this filename
+        """
+        definitions = {}
+        for f in self.funcnames:
+            definitions[f] = self.filename
+        for s in self.subnames:
+            definitions[s] = self.filename
+        return definitions
+
+    def resolve(self, callable_names):
+        """
+        Resolve the raw call candidates against the global list of routine names
+
+        Args
+        ----
+        callable_names : NameIndex or list
+            Global index of all suitable function/subroutine names, including
+            interface names. Build the NameIndex once and share it between
+            files, a list is converted on every call
+
+        Returns
+        -------
+        calls : ordered dict
+            Dictionary holding the routine mappings. The key is the callable
+            function/subroutine name and the value is a list of routine calls
+        numcalls : ordered dict
+            Dictionary holding the routine mappings. The key is the callable
+            function/subroutine name and the value is number of routine calls made
+            by that function/subroutine
+        """
+        calls    = OrderedDict()
+        numcalls = OrderedDict()
+
+        if (not isinstance(callable_names, NameIndex)):
+            callable_names = NameIndex(callable_names)
+        lookup = callable_names.lookup
+
+        for sid in self.candidates.keys():
+            # always include the programs, only include routines that are callable
+            k = self.scopes[sid].name
+            if ((k not in self.programs) and (k not in callable_names)):
+                continue
+            if (k in calls): # the first definition wins
+                continue
+            calls[k] = []
+            for name, ctype, lineno in self.candidates[sid]:
+                canonical = lookup(name)
+                if (canonical is not None):
+                    calls[k].append([canonical, ctype])
+
+        # compute total number of calls in each routine
+        for k in calls.keys():
+            numcalls[k] = len(calls[k])
+
+        return calls, numcalls
+
+    def resolve_scopes(self, table):
+        """
+        Resolve the raw call candidates through the scoped symbol table
+
+        Args
+        ----
+        table : SymbolTable
+            Global symbol table of the whole source tree
+
+        Returns
+        -------
+        calls : ordered dict
+            Dictionary holding the routine mappings. The key is the scope id of
+            the function/subroutine/program and the value is a list of
+            [scope id, calltype, lineno] routine calls, one for every call
+            site, see graph.CallGraph for how they are collapsed
+        """
+        calls = OrderedDict()
+        for sid in self.candidates.keys():
+            if (sid in table.ignored): continue
+            calls[sid] = []
+            for name, ctype, lineno in self.candidates[sid]:
+                callee = table.resolve(sid, name)
+                if (callee is not None):
+                    calls[sid].append([callee, ctype, lineno])
+        return calls
+
+def ScanFile(filename, verbose=False, mapped=None):
+    """
+    Parse a Fortran file for definitions and call candidates in a single pass
+
+    Args
+    ----
+    filename : string
+        The filename of the Fortran source code to parse
+    verbose : bool, optional
+        Print more information to screen
+    mapped : bool, optional
+        Memory map the file and skip the comments, blank lines and irrelevant
+        lines as bytes, see lexer.MappedStatements. The result is the same.
+        By default only files of at least MMAP_SIZE bytes are mapped
+
+    Returns
+    -------
+    scan : FileScan
+        The definitions and raw call candidates found in the file, None if the
+        file does not exist
+    """
 
     if (not os.path.isfile(filename)):
         print("ERROR: {} does not exist, skipping".format(filename))
         return
 
-    # regular expressions for "end program", "end subroutine", and "end function"
-    # (\s*) = 0 or more white space
-    # (\s+) = 1 or more white space
-    # (end) = "end"
-    # ^     = start of the line
-    # ((?:[a-z_][a-z_0-9]+)) = pretty much any fortran acceptable variable name
-    #    ?: matches whatever follows, but cant be stored unless the entire re.compile()
-    #       is set equal to something. This is more efficient than searching each time
-    #    [a-z_] is any letter plus the underscore
-    #    [a-z_0-9] is any letter, number, or underscore
-    #    the following "+" results in 1 or more repetitions of what came before it
-    #    | is logical OR
-    #    DOTALL allows the "." character to include newlines, it usually doesn't
-    sfunc = re.compile("(\s*)(function)(\s+)((?:[a-z_][a-z_0-9]+))(\s*)",
-                        re.IGNORECASE|re.DOTALL)
-    sprog = re.compile("(^\s*)(program)(\s+)((?:[a-z_][a-z_0-9]+))",
-                        re.IGNORECASE|re.DOTALL)
-    sintr = re.compile("(^\s*)(interface)(\s+)((?:[a-z_][a-z_0-9]+))",
-                        re.IGNORECASE|re.DOTALL)
-    ssubr = re.compile("(^\s*)(subroutine)(\s+)((?:[a-z_][a-z_0-9]+))(\s*)",
-                        re.IGNORECASE|re.DOTALL)
-    efunc = re.compile("(^\s*)(end)(\s+)(function)(\s+)((?:[a-z_][a-z_0-9]+))(\s*)",
-                        re.IGNORECASE|re.DOTALL)
-    eprog = re.compile("(^\s*)(end)(\s+)(program)(\s+)((?:[a-z_][a-z_0-9]+))",
-                        re.IGNORECASE|re.DOTALL)
-    eintr = re.compile("(^\s*)(end)(\s+)(interface)(\s+)((?:[a-z_][a-z_0-9]+))",
-                        re.IGNORECASE|re.DOTALL)
-    esubr = re.compile("(^\s*)(end)(\s+)(subroutine)(\s+)((?:[a-z_][a-z_0-9]+))",
-                        re.IGNORECASE|re.DOTALL)
-    modpr = re.compile("(^\s*)(module)(\s+)(procedure)(\s+)((?:[a-z_][a-z_0-9]+))",
-                        re.IGNORECASE|re.DOTALL)
-    paren = re.compile("(\s*)(\()", re.IGNORECASE|re.DOTALL)
+    scan = FileScan(filename)
 
     found_main = False
-    start_interface = False
+    in_interface = False # inside of an interface block
+    in_type    = False # inside of a derived type definition
+    lineno     = 0    # the first line of the current statement
+    interface  = None # the generic interface that is being parsed
+    bodies     = 0    # nesting depth of the interface bodies being skipped
+    stack      = []   # the scopes that are currently open, innermost last
+    arrays     = {}   # scope id : names of the arrays declared in that scope
 
     if (verbose):
         print("\tparsing file = {}".format(filename))
-    with open(filename, 'r') as mf:
-
-        for _line in mf:
 
-            line = _line.lower()
+    # logical statements: continuation lines are joined, lines are split on
+    # ";", and comments, blank lines and preprocessor lines are removed
+    fixed_form = IsFixedForm(filename)
+    if (mapped is None):
+        mapped = (os.path.getsize(filename) >= MMAP_SIZE)
+    if (mapped):
+        mf = None
+        statements = MappedStatements(filename, fixed_form=fixed_form)
+    else:
+        mf = open(filename, 'r')
+        statements = Statements(mf, fixed_form=fixed_form)
+    try:
+        for lineno, line in statements:
+
+            # one regex pass classifies the statement, see lexer.STATEMENT
+            kind, name = classify(line)
+
+            if (kind == "end"):
+                if (name == "type"):
+                    in_type = False
+                elif (name == "interface"):
+                    in_interface = False
+                    interface = None
+                    bodies = 0
+                elif (bodies > 0): # the end of an interface body
+                    bodies -= 1
+                elif (name in ["module", "program"]): # close everything up to the unit
+                    while (len(stack) > 0) and (stack.pop().kind != name): pass
+                elif (len(stack) > 0): # a bare "end" or the end of a function/subroutine
+                    stack.pop()
+                continue
 
-            if (line.lstrip().startswith("!")): continue # skip comments
-            if (line.lstrip() == ""): continue           # skip empty lines
+            ####################################
+            # interface bodies
+            ####################################
+            # functions/subroutines inside of an interface block only declare
+            # an external procedure, they are not definitions. For a generic
+            # interface they are the specific procedures
+            if (in_interface and (kind in ["function", "subroutine"])):
+                if ((bodies == 0) and (interface is not None)):
+                    interface.specifics.append(name)
+                bodies += 1
+                continue
+            if (bodies > 0): continue
 
-            i = line.find("!") # strip off any trailing comments. find returns -1
-                               # if substring is not found, but -1 is a valid slice index
-            if (i > 0):        # so protect against that.
-                line = line[:i]
+            ####################################
+            # derived types
+            ####################################
+            # the components, bindings and private statements of a derived
+            # type belong to the type, the whole definition is skipped
+            if (in_type): continue
+            if (kind == "type"):
+                in_type = True
+                continue
 
             ####################################
             # main program definition
             ####################################
-            if (not found_main): # determine if this file contains the main program
-                sprogram = sprog.search(line)
-                eprogram = eprog.search(line)
-                # re.search(line) returns if it is found and what the match is
-                # group(i) returns the i-th parenthesized subgroup of the search pattern
-                # for the sprogram:
-                #     i=0 is whole thing
-                #     i=1 is possible space
-                #     i=2 is "program"
-                #     i=3 is one or more spaces
-                #     i=4 is the name
-                if (sprogram and not(eprogram)): # ensure this is the beginning, not end
-                    Pname = sprogram.group(4).strip()
-                    main_name = Pname
-                    funcnames.append(main_name)
-                    contains_main = True
+            if (kind == "program"):
+                if (not found_main): # the first program is the main program
+                    scan.main_name = name
+                    scan.funcnames.append(name)
+                    scan.contains_main = True
                     found_main = True
-                    continue
+                scan.programs.append(name)
+                stack.append(scan.add_scope(Scope("program", name, filename=filename)))
+                continue
 
             ####################################
-            # interface blocks
+            # module definitions
             ####################################
-            sinterface = sintr.search(line)
-            einterface = eintr.search(line)
-            par        = paren.search(line) # valid interface blocks should not have "("
-            if (sinterface and not(einterface) and not(par)):
-                start_interface = True
-                Iname = sinterface.group(4).strip()
-                interfaces[Iname] = []
+            if (kind == "module"):
+                stack.append(scan.add_scope(Scope("module", name, filename=filename)))
                 continue
 
-            if (start_interface): # parse the interface stuff
-                mod = modpr.search(line)
-                if (mod):
-                    i = line.find("procedure")                # modpr wont get the comma
-                    names = line[i+len("procedure"):].strip() # separated list, do that
-                    names = names.split(",")                  # manually
-                    for n in names:
-                        interfaces[Iname].append(n)
-                    continue
+            if (kind == "use"): # use statements of the current scope
+                if (len(stack) > 0):
+                    module, only, renames = ParseUse(name)
+                    if (module is not None):
+                        stack[-1].uses.append((module, only, renames))
+                continue
 
-            if (einterface and not(par)): # this is the end of a valid interface
-                start_interface = False
+            if (kind in ["public", "private"]): # access statements of a module
+                if (len(stack) > 0) and (stack[-1].kind == "module"):
+                    if (name is None): # the default for the whole module
+                        stack[-1].private = (kind == "private")
+                    else:
+                        for n in name.split(","):
+                            stack[-1].access["".join(n.split())] = kind
                 continue
 
+            # the scope that holds any new definition
+            parent = stack[-1].id if (len(stack) > 0) else None
+            module = _enclosing_module(stack)
+
             ####################################
-            # function definitions
+            # interface blocks
             ####################################
-            sfunction = sfunc.search(line)
-            efunction = efunc.search(line)
-            if (sfunction and not(efunction)):
-                Fname = sfunction.group(4).strip()
-                funcnames.append(Fname)
+            if (kind == "interface"):
+                in_interface = True
+                if (name is None): # an explicit or abstract interface, not generic
+                    interface = None
+                    continue
+                interface = scan.add_scope(Scope("interface", name, parent, filename))
+                scan.interfaces[name] = interface.specifics
+                if (module is not None):
+                    scan.modules[name] = module
+                continue
+
+            if (kind == "procedure"): # "module procedure a, b" or "procedure :: a, b"
+                if (interface is not None): # the comma separated list of specific routines
+                    for n in name.split(","):
+                        interface.specifics.append(n.strip())
                 continue
 
             ####################################
-            # subroutine definitions
+            # function/subroutine definitions
             ####################################
-            ssubroutine = ssubr.search(line)
-            esubroutine = esubr.search(line)
-            if (ssubroutine and not(esubroutine)):
-                Sname = ssubroutine.group(4).strip()
-                subnames.append(Sname)
+            if (kind == "function"):
+                scan.funcnames.append(name)
+            elif (kind == "subroutine"):
+                scan.subnames.append(name)
+            if (kind is not None):
+                if (module is not None):
+                    scan.modules[name] = module
+                stack.append(scan.add_scope(Scope(kind, name, parent, filename)))
                 continue
 
-    # finally, map the routine name to the filename
-    for f in funcnames:
-        definitions[f] = filename
-    for s in subnames:
-        definitions[s] = filename
-
-    return funcnames, subnames, interfaces, definitions, contains_main, main_name
+            ####################################
+            # declarations
+            ####################################
+            if ((len(stack) > 0) and line.startswith(DECLARATION_STARTS)):
+                declared = DeclaredArrays(line)
+                if (declared is not None): # declarations hold no calls
+                    if (len(declared) > 0):
+                        arrays.setdefault(stack[-1].id, set()).update(declared)
+                    continue
 
-def ParseFile(filename, callable_names, verbose=False):
+            ####################################
+            # call candidates
+            ####################################
+            if (len(stack) > 0) and (stack[-1].kind != "module"):
+                current = scan.candidates[stack[-1].id]
+                if ("'" in line) or ('"' in line): # no calls or operators in strings
+                    line = STRING.sub("''", line)
+                s = SUBROUTINE_CALL.search(line) if ("call" in line) else None
+                if ("(" in line): # a function call always has an argument list
+                    for c in SOME_CALL.finditer(line):
+                        callee = c.group(1)
+                        if ((s is not None) and (c.start(1) == s.start(1))):
+                            current.append([callee, "s", lineno]) # definitely a subroutine call
+                        elif ((callee not in KEYWORDS) and
+                              ((len(arrays) == 0) or (not _is_array(callee, stack, arrays)))):
+                            current.append([callee, "f", lineno]) # a function call or an
+                                                                  # array not declared here
+                if ((s is not None) and (s.group(2) == "")): # "call name", no argument list
+                    current.append([s.group(1), "s", lineno])
+                if ("." in line): # user defined operators are calls to the generic interface
+                    for op in DEFINED_OPERATOR.findall(line):
+                        if (op not in INTRINSIC_OPERATORS):
+                            current.append([OperatorName(op), "o", lineno])
+
+        scan.lines = lineno
+
+    finally:
+        if (mf is not None):
+            mf.close()
+
+    return scan
+
+def ScanFiles(files, jobs=1, verbose=False, cache=None, chunksize=8, profile=None,
+              mapped=None, stamps=None):
     """
-    Parse a Fortran file to determine what routines each function/subroutine calls
+    Scan a list of Fortran files, optionally spread across a pool of processes
+
+    The files are consumed as they arrive, so scanning starts while a directory
+    walk that generates them, see utilities.iterwalk, is still running
 
     Args
     ----
-    filename : string
-        The filename of the Fortran source code to parse
-    callable_names : list
-        Global list of all suitable function/subroutine names, including interface names
+    files : iterable
+        The filenames of the Fortran source code to parse, a list or a generator
+    jobs : int, optional
+        Number of processes used to scan the files, the files are scanned
+        serially if this is 1
     verbose : bool, optional
         Print more information to screen
+    cache : ParseCache, optional
+        Serve unchanged files from this cache and store the new scan results
+    chunksize : int, optional
+        Number of files handed to a process at once
+    profile : Profiler, optional
+        Report the time and the lines of every scanned file and the cache hits
+        to this profiler, see profiling.Profiler. Nothing is timed if None
+    mapped : bool, optional
+        Memory map every file, or none, see ScanFile. By default only the
+        large files are mapped
+    stamps : dict, optional
+        Dictionary holding filename:(mtime, size) pairs taken before the scan,
+        stored in the cache with the scan results. The files that are not in
+        it are stat'ed right before they are scanned, so a file that changes
+        during its scan is not cached under its new mtime and size
 
     Returns
     -------
-    calls : ordered dict
-        Dictionary holding the routine mappings. The key is the callable
-        function/subroutine name and the value is a list of routine calls
-    numcalls : ordered dict
-        Dictionary holding the routine mappings. The key is the callable
-        function/subroutine name and the value is number of routine calls made
-        by that function/subroutine
+    scans : list
+        List of FileScan objects in the same order as the given files, files
+        that do not exist are left out. The result does not depend on jobs
     """
+    jobs = max(1, int(jobs))
+    scans   = []   # FileScan, or None while the file is being scanned
+    pending = []   # (indices into scans, filenames, AsyncResult) of each chunk
+    chunk   = []   # (index into scans, filename, stamp) not handed out yet
+    pool    = None # only started once a file is not served by the cache
+    timed   = (profile is not None)
+
+    def flush():
+        names = [f for i,f,st in chunk]
+        pending.append(([i for i,f,st in chunk], names, [st for i,f,st in chunk],
+                        pool.apply_async(_scan_chunk, (names, verbose, timed, mapped))))
+        del chunk[:]
+
+    def stamp(f):
+        if (cache is None): return None
+        if ((stamps is not None) and (f in stamps)): return stamps[f]
+        return _stamp(f)
+
+    try:
+        for f in files:
+            scan = cache.get(f) if (cache is not None) else None
+            if (scan is not None):
+                if (timed): profile.hit(f)
+            elif (jobs == 1):
+                st = stamp(f)
+                if (timed):
+                    scan, seconds = _scan_timed(f, verbose, mapped)
+                    _record(profile, f, scan, seconds)
+                else:
+                    scan = ScanFile(f, verbose=verbose, mapped=mapped)
+                if ((cache is not None) and (scan is not None) and (st is not None)):
+                    cache.put(f, scan, st)
+            else:
+                if (pool is None): # only pay for importing multiprocessing if it is used
+                    import multiprocessing
+                    pool = multiprocessing.Pool(jobs)
+                chunk.append((len(scans), f, stamp(f)))
+                if (len(chunk) == chunksize):
+                    flush()
+            scans.append(scan)
+        if (len(chunk) > 0):
+            flush()
+
+        for indices, names, stamped, result in pending:
+            for i, f, st, scan in zip(indices, names, stamped, result.get()):
+                if (timed):
+                    scan, seconds = scan
+                    _record(profile, f, scan, seconds)
+                scans[i] = scan
+                if ((cache is not None) and (scan is not None) and (st is not None)):
+                    cache.put(f, scan, st)
+    finally:
+        if (pool is not None):
+            pool.close()
+            pool.join()
+
+    return [s for s in scans if s is not None]
+
+def _stamp(filename):
+    """
+    Return the (mtime, size) of a file, None if it does not exist
+    """
+    try:
+        st = os.stat(filename)
+    except OSError:
+        return None
+    return (st.st_mtime, st.st_size)
 
-    calls    = OrderedDict()
-    numcalls = OrderedDict()
-
-    sprogram = re.compile("(^\s*)(program)(\s+)((?:[a-z_][a-z_0-9]+))",
-                          re.IGNORECASE|re.DOTALL)
-    eprogram = re.compile("(^\s*)(end)(\s+)(program)(\s+)((?:[a-z_][a-z_0-9]+))",
-                          re.IGNORECASE|re.DOTALL)
-    sfuncdef = re.compile("(\s*)(function)(\s+)((?:[a-z_][a-z_0-9]+))(\s*)",
-                          re.IGNORECASE|re.DOTALL)
-    efuncdef = re.compile("(^\s*)(end)(\s+)(function)(\s+)((?:[a-z_][a-z_0-9]+))(\s*)",
-                          re.IGNORECASE|re.DOTALL)
-    ssubdef  = re.compile("(^\s*)(subroutine)(\s+)((?:[a-z_][a-z_0-9]+))(\s*)",
-                          re.IGNORECASE|re.DOTALL)
-    esubdef  = re.compile("(^\s*)(end)(\s+)(subroutine)(\s+)((?:[a-z_][a-z_0-9]+))(\s*)",
-                          re.IGNORECASE|re.DOTALL)
-    some_call = re.compile("(\s*)((?:[a-z_][a-z_0-9]+))(\s*)(\()", re.IGNORECASE|re.DOTALL)
-    sub_call  = re.compile("(\s*)(call)(\s+)((?:[a-z_][a-z_0-9]+))(\s*)(\()",
-                           re.IGNORECASE|re.DOTALL)
-
-    start_parse = False
-
-    if (verbose):
-        print("\tparsing file = {}".format(filename))
-    with open(filename, 'r') as mf:
+def _scan_chunk(filenames, verbose, timed, mapped):
+    """
+    Process pool entry point, scan a chunk of files. If timed, every scan is
+    returned as a (scan, seconds) pair
+    """
+    if (timed):
+        return [_scan_timed(f, verbose, mapped) for f in filenames]
+    return [ScanFile(f, verbose=verbose, mapped=mapped) for f in filenames]
 
-        for _line in mf:
+def _scan_timed(filename, verbose, mapped):
+    """
+    Scan a single file and return the scan and the time it took
+    """
+    from profiling import clock
+    start = clock()
+    scan = ScanFile(filename, verbose=verbose, mapped=mapped)
+    return scan, clock() - start
 
-            line = _line.lower()
+def _record(profile, filename, scan, seconds):
+    """
+    Report a scanned file to the profiler
+    """
+    profile.file(filename, seconds, scan.lines if (scan is not None) else 0)
 
-            if (line.lstrip().startswith("!")): continue # skip comments
-            if (line.lstrip() == ""): continue           # skip empty lines
+def _is_array(name, stack, arrays):
+    """
+    Return True if the name was declared as an array in any of the open scopes
+    """
+    for scope in stack:
+        if (name in arrays.get(scope.id, ())):
+            return True
+    return False
 
-            i = line.find("!") # strip off any trailing comments. find returns -1
-                               # if substring is not found, but -1 is a valid slice index
-            if (i > 0):        # so protect against that.
-                line = line[:i]
+def _enclosing_module(stack):
+    """
+    Return the name of the module that holds the innermost open scope, None if
+    the scope is not inside of a module
+    """
+    for scope in stack:
+        if (scope.kind == "module"):
+            return scope.name
+    return None
 
-            sprog = sprogram.search(line) # is this the main program
-            eprog = eprogram.search(line)
-            if (sprog and not(eprog)):
-                start_parse = True
-                Cname = sprog.group(4).strip()
-                if (Cname not in calls.keys()): # always include the main program
-                    calls[Cname] = []
-                continue
-            if (eprog):
-                start_parse = False
-                continue
+def FindDefinitions(filename, verbose=False):
+    """
+    Parse a Fortran file for function/subroutine definitions
 
-            sfunc = sfuncdef.search(line) # is this a function definition
-            efunc = efuncdef.search(line)
-            if (sfunc and not(efunc)):
-                i = line.find("function")
-                if ("'" in line[:i]): continue # these hopefully catch: "function 2"
-                if ('"' in line[:i]): continue
-                Cname = sfunc.group(4).strip()
-                if (Cname not in calls.keys()):
-                    if (Cname in callable_names): # only include if its considered callable
-                        start_parse = True
-                        calls[Cname] = []
-                continue
-            if (efunc):
-                start_parse = False
-                continue
+    Args
+    ----
+    filename : string
+        The filename of the Fortran source code to parse
+    verbose : bool, optional
+        Print more information to screen
 
-            ssub = ssubdef.search(line) # is this a subroutine definition
-            esub = esubdef.search(line)
-            if (ssub and not(esub)):
-                Cname = ssub.group(4).strip()
-                if (Cname not in calls.keys()):
-                    if (Cname in callable_names): # only include if its considered callable
-                        start_parse = True
-                        calls[Cname] = []
-                continue
-            if (esub):
-                start_parse = False
-                continue
+    Returns
+    -------
+    funcnames : list
+        List of function names that are defined in this file
+    subnames : list
+        List of subroutine names that are defined in this file
+    interfaces : dict
+        Dictionary holding the interface mappings. The key is the interface
+        name and the values are the routines that the interface name could call
+    definitions : dict
+        Dictionary holding the routine mappings. The key is the callable
+        function/subroutine name and the value is the filename that holds
+        its definition
+    contains_main : bool
+        Indicates whether or not this file contains the main program
+    main_name : str
+        The name of the main program if it was found, None if it was not found
+    """
+    scan = ScanFile(filename, verbose=verbose)
+    if (scan is None):
+        return
 
-            # catch a few odd instances: trailing "end" or "end function" or "end subroutine"
-            if (line.strip() == "end"):
-                start_parse = False
-                continue
-            l = line.split()
-            if (l[0] == "end" and l[1] in ["function", "subroutine"]):
-                start_parse = False
-                continue
+    return scan.funcnames, scan.subnames, scan.interfaces, scan.definitions, \
+           scan.contains_main, scan.main_name
 
-            if (start_parse):
-                c = some_call.search(line) # this should catch subroutine & function calls
-                if (c):                    # and a few unwanted array operations
-                    s = sub_call.search(line)
-                    if (s): # this is definitely a subroutine call
-                        name = s.group(4).strip()
-                        if (name in callable_names): # this is a valid subroutine call
-                            calls[Cname].append([name, "s"])
-                    else: # this could be a function call or an array operation
-                        name = c.group(2).strip()
-                        if (name in callable_names): # this is a valid function call
-                            calls[Cname].append([name, "f"])
-                continue
+def ParseFile(filename, callable_names, verbose=False):
+    """
+    Parse a Fortran file to determine what routines each function/subroutine calls
 
-    # compute total number of calls in each routine
-    for k in calls.keys():
-        v = calls[k] # should be a list of [name, "c"] elements
-        numcalls[k] = len(v)
+    Args
+    ----
+    filename : string
+        The filename of the Fortran source code to parse
+    callable_names : NameIndex or list
+        Global index of all suitable function/subroutine names, including interface names
+    verbose : bool, optional
+        Print more information to screen
 
-    return calls, numcalls
+    Returns
+    -------
+    calls : ordered dict
+        Dictionary holding the routine mappings. The key is the callable
+        function/subroutine name and the value is a list of routine calls
+    numcalls : ordered dict
+        Dictionary holding the routine mappings. The key is the callable
+        function/subroutine name and the value is number of routine calls made
+        by that function/subroutine
+    """
+    scan = ScanFile(filename, verbose=verbose)
+    if (scan is None):
+        return
 
+    return scan.resolve(callable_names)
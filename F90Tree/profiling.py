@@ -0,0 +1,236 @@
+"""
+Instrumentation of a run: phase timers, per-file scan times and counters
+
+A Profiler is handed to main.Parse, which times each phase and reports every
+scanned file and the cache hits to it. Nothing is measured if no Profiler is
+given. Optionally the whole run is profiled with cProfile and the memory is
+traced with tracemalloc.
+
+Examples
+--------
+>>> def show(event, data):
+>>>     if (event == "phase"):
+>>>         print(data["phase"], data["seconds"])
+>>> profile = Profiler(callback=show, memory=True)
+>>> Parse("/path/to/source", profile=profile)
+>>> report = profile.report()
+>>> report["files"]["slowest"][0]
+{'file': '/path/to/source/solver.F90', 'seconds': 0.052, 'lines': 4210}
+>>> profile.write("profile.json")
+"""
+from __future__ import print_function
+import json
+import time
+from collections import OrderedDict
+
+# the most accurate wall clock
+clock = getattr(time, "perf_counter", time.time)
+
+class Profiler(object):
+    """
+    Collect the timings and counters of a run
+
+    Args
+    ----
+    callback : function, optional
+        Called as callback(event, data) whenever something is measured, event
+        is "phase", "file", "cached" or "report" and data is a dictionary
+    cprofile : bool, optional
+        Profile the run with cProfile, the functions that take the most time
+        are part of the report. Only the main process is profiled
+    memory : bool, optional
+        Trace the memory allocations with tracemalloc, the memory in use after
+        each phase and the peak are part of the report
+    slowest : int, optional
+        Number of slowest files that are reported
+    """
+
+    def __init__(self, callback=None, cprofile=False, memory=False, slowest=10):
+        self.callback = callback
+        self.cprofile = cprofile
+        self.memory   = memory
+        self.nslowest = slowest
+
+        self.phases   = OrderedDict() # phase:seconds, in the order they ran
+        self.memories = OrderedDict() # phase:bytes in use after the phase
+        self.files    = []            # (seconds, lines, filename) of every scanned file
+        self.cached   = 0             # files served by the cache
+        self.counters = OrderedDict() # name:value, e.g. the number of routines
+        self.profiler = None
+        self.started  = None
+        self.last     = None          # the end of the previous lap
+        self.elapsed  = None
+        self.peak     = None
+
+    def start(self):
+        """
+        Start the clock and the optional cProfile and tracemalloc
+        """
+        if (self.memory):
+            try:
+                import tracemalloc
+                tracemalloc.start()
+            except ImportError: # python 2
+                self.memory = False
+        if (self.cprofile):
+            import cProfile
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+        self.started = clock()
+        self.last = self.started
+
+    def stop(self):
+        """
+        Stop the clock and the optional cProfile and tracemalloc, then report
+        """
+        self.elapsed = clock() - self.started
+        if (self.profiler is not None):
+            self.profiler.disable()
+        if (self.memory):
+            import tracemalloc
+            self.peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        if (self.callback is not None):
+            self.callback("report", self.report())
+
+    def lap(self, name):
+        """
+        Add the time since the previous lap, or since the start, to a phase
+        """
+        now = clock()
+        self.add(name, now - self.last)
+        self.last = now
+
+    def add(self, name, seconds):
+        """
+        Add the given time to a phase
+        """
+        self.phases[name] = self.phases.get(name, 0.0) + seconds
+        if (self.memory):
+            import tracemalloc
+            self.memories[name] = tracemalloc.get_traced_memory()[0]
+        if (self.callback is not None):
+            self.callback("phase", {"phase":name, "seconds":seconds})
+
+    def timed(self, name, iterable):
+        """
+        Generate the items of an iterable and add the time spent producing them
+        to the given phase, e.g., a directory walk that is consumed while the
+        files are scanned
+        """
+        total = 0.0
+        it = iter(iterable)
+        while True:
+            start = clock()
+            try:
+                item = next(it)
+            except StopIteration:
+                break
+            finally:
+                total += clock() - start
+            yield item
+        self.add(name, total)
+
+    def file(self, filename, seconds, lines):
+        """
+        Record the scan of a single file
+        """
+        self.files.append((seconds, lines, filename))
+        if (self.callback is not None):
+            self.callback("file", {"file":filename, "seconds":seconds, "lines":lines})
+
+    def hit(self, filename):
+        """
+        Record a file that was served by the cache
+        """
+        self.cached += 1
+        if (self.callback is not None):
+            self.callback("cached", {"file":filename})
+
+    def count(self, name, value):
+        """
+        Set a counter, e.g., the number of routines
+        """
+        self.counters[name] = value
+
+    def slowest(self, n=None):
+        """
+        Return the (seconds, lines, filename) of the n slowest files to scan
+        """
+        if (n is None):
+            n = self.nslowest
+        return sorted(self.files, reverse=True)[:n]
+
+    def functions(self, n=20):
+        """
+        Return the n functions that took the most time, including the time of
+        the functions they called, empty if cProfile was not used
+        """
+        if (self.profiler is None):
+            return []
+        import pstats
+        stats = pstats.Stats(self.profiler).stats
+        rows = []
+        for (filename, line, function), (cc, nc, tt, ct, callers) in stats.items():
+            rows.append({"function":"{}:{}({})".format(filename, line, function),
+                         "calls":nc, "tottime":tt, "cumtime":ct})
+        rows.sort(key=lambda r: r["cumtime"], reverse=True)
+        return rows[:n]
+
+    def report(self):
+        """
+        Return all measurements as a dictionary that can be saved as JSON
+        """
+        scanned = len(self.files)
+        seconds = sum([f[0] for f in self.files])
+        lines = sum([f[1] for f in self.files])
+        total = scanned + self.cached
+        report = OrderedDict()
+        report["elapsed"] = self.elapsed
+        report["phases"] = self.phases
+        report["files"] = OrderedDict([
+            ("scanned", scanned), ("lines", lines), ("seconds", seconds),
+            ("lines_per_s", lines/seconds if (seconds > 0) else None),
+            ("slowest", [OrderedDict([("file",f), ("seconds",t), ("lines",l)])
+                         for t,l,f in self.slowest()])])
+        report["cache"] = OrderedDict([("hits", self.cached), ("misses", scanned),
+                          ("hit_rate", float(self.cached)/total if (total > 0) else None)])
+        report["counters"] = self.counters
+        if (self.memory):
+            report["memory"] = OrderedDict([("peak", self.peak), ("phases", self.memories)])
+        if (self.profiler is not None):
+            report["functions"] = self.functions()
+        return report
+
+    def write(self, filename):
+        """
+        Save the report as JSON
+        """
+        with open(filename, "w") as mf:
+            json.dump(self.report(), mf, indent=2)
+
+    def summary(self):
+        """
+        Print the phases, the cache hit rate and the slowest files
+        """
+        report = self.report()
+        print("\nProfile, {:.3f} s in total".format(report["elapsed"] or 0.0))
+        for name, seconds in report["phases"].items():
+            print("\t{:<10} {:>9.3f} s".format(name, seconds))
+        files = report["files"]
+        if (files["lines_per_s"] is not None):
+            print("\tscanned {} files, {} lines, {:.0f} lines/s".format(files["scanned"],
+                  files["lines"], files["lines_per_s"]))
+        if (report["cache"]["hit_rate"] is not None):
+            print("\tcache hit rate {:.1%}".format(report["cache"]["hit_rate"]))
+        if (len(files["slowest"]) > 0):
+            print("\tslowest files:")
+            for f in files["slowest"]:
+                print("\t\t{:.4f} s {:>7} lines  {}".format(f["seconds"], f["lines"], f["file"]))
+        if ("memory" in report):
+            print("\tpeak traced memory {:.1f} MB".format(report["memory"]["peak"]/1024.**2))
+        if ("functions" in report):
+            print("\tfunctions with the most cumulative time:")
+            for f in report["functions"][:10]:
+                print("\t\t{:>9.3f} s {:>9} calls  {}".format(f["cumtime"], f["calls"],
+                      f["function"]))
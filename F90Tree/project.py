@@ -0,0 +1,326 @@
+"""
+Keep the analysis of a source tree in memory and bring it up to date cheaply
+
+Examples
+--------
+>>> project = Project("/path/to/source", include_ext=["F90"])
+>>> project.refresh()          # the first call scans every file
+True
+>>> project.graph.called_by("utils::setup")
+['driver']
+>>> project.refresh()          # later calls only scan the files that changed
+False
+"""
+from __future__ import print_function
+import os
+from collections import OrderedDict
+from utilities import treewalk
+from parsers import ScanFiles
+from graph import CallGraph
+from symbols import SymbolTable
+
+class Project(object):
+    """
+    The scans, symbol table and call graph of a source tree
+
+    Every refresh walks the tree and compares the modification time and size
+    of each file with the previous refresh, only new and modified files are
+    scanned again. The resolved calls are kept per file and the scans keep
+    every call candidate, resolved or not, together with an inverted index
+    from each name to the files that mention it. The changed files are always
+    resolved again. If they add, remove or change routines or interfaces,
+    only the other files that mention those names are resolved again, from
+    their scans and without reading the source. A change to a module itself,
+    i.e., a new or removed module or a change to its use or access statements,
+    can change what any name resolves to and every file is resolved again.
+
+    The call graph is then rebuilt from the per-file calls, which costs time
+    and memory linear in the number of routines and call sites on every
+    refresh that changes anything. Nothing quadratic is rebuilt: the graph
+    only memoizes shortest paths, recursive cycles and the calls leaving
+    them. Those results are taken over from the previous graph unless the
+    routine they start from calls, directly or not, a routine whose callees
+    changed, see CallGraph.inherit.
+
+    Args
+    ----
+    directory : str
+        Path to the directory that holds the source code
+    include_ext : list, optional
+        List of valid file extensions
+    exclude_dirs : list, optional
+        List of directory patterns to exclude
+    ignore : list, optional
+        List of routine names or ids to exclude
+    jobs : int, optional
+        Number of processes used to scan the files
+    cache : ParseCache, optional
+        Serve unchanged files from this cache on the first refresh
+    verbose : bool, optional
+        Print more status information to the screen
+    include, exclude : list, optional
+        List of file patterns to include and to exclude, see utilities.iterwalk
+    walkers : int, optional
+        Number of threads that walk the directory tree
+    """
+
+    def __init__(self, directory, include_ext=[], exclude_dirs=[], ignore=[], jobs=1,
+                 cache=None, verbose=False, include=[], exclude=[], walkers=1):
+        self.directory    = directory
+        self.include_ext  = include_ext
+        self.exclude_dirs = exclude_dirs
+        self.ignore       = ignore
+        self.jobs         = jobs
+        self.cache        = cache
+        self.verbose      = verbose
+        self.include      = include
+        self.exclude      = exclude
+        self.walkers      = walkers
+
+        self.files      = []            # filenames in the order of the last walk
+        self.stamps     = {}            # filename:(mtime, size) when it was scanned
+        self.scans      = {}            # filename:FileScan
+        self.signatures = {}            # filename:definitions, see _signature
+        self.calls      = {}            # filename:resolved calls of the file
+        self.references = {}            # name:set of the files that mention it
+        self.mentions   = {}            # filename:names the file mentions, see _mentions
+        self.interfaces = OrderedDict() # interface_id:[specific routines]
+        self.dispatch   = OrderedDict() # interface_id:[resolved specific ids]
+        self.table      = None
+        self.graph      = None
+        self.generation = 0             # incremented whenever the graph changes
+
+    def changes(self):
+        """
+        Walk the tree and compare it with the last refresh
+
+        Returns
+        -------
+        files : list
+            All filenames that were found
+        dirty : ordered dict
+            Dictionary holding filename:(mtime, size) pairs of the new and
+            modified files
+        removed : list
+            The files that disappeared since the last refresh
+        """
+        files = treewalk(self.directory, include_ext=self.include_ext,
+                         exclude_dirs=self.exclude_dirs, include=self.include,
+                         exclude=self.exclude, threads=self.walkers)
+        dirty = OrderedDict()
+        for f in files:
+            try:
+                st = os.stat(f)
+            except OSError: # removed during the walk
+                continue
+            if (self.stamps.get(f) != (st.st_mtime, st.st_size)):
+                dirty[f] = (st.st_mtime, st.st_size)
+        found = set(files)
+        removed = [f for f in self.scans.keys() if f not in found]
+        return files, dirty, removed
+
+    def refresh(self):
+        """
+        Bring the scans, the symbol table and the graph up to date
+
+        Returns
+        -------
+        changed : bool
+            True if any file changed and the graph was rebuilt
+        """
+        files, dirty, removed = self.changes()
+        if ((self.graph is not None) and (len(dirty) == 0) and (len(removed) == 0)):
+            return False
+
+        # the files were stat'ed before they are scanned, a file written during
+        # the scan is seen as modified again on the next refresh
+        self.stamps.update(dirty)
+
+        everything = (self.table is None) # resolve every file
+        redefined  = everything or (len(removed) > 0)
+        affected   = set() # names whose definitions changed
+        changed    = set() # routine ids whose callees changed
+        for f in removed:
+            everything = _affected(self.signatures[f], [], affected) or everything
+            changed.update(self.calls.get(f, {}).keys())
+            self._unindex(f)
+            for d in [self.stamps, self.scans, self.signatures, self.calls]:
+                d.pop(f, None)
+        scans = ScanFiles(list(dirty.keys()), jobs=self.jobs, verbose=self.verbose,
+                          cache=self.cache, stamps=dirty)
+        for scan in scans:
+            f = scan.filename
+            signature = _signature(scan)
+            if (self.signatures.get(f) != signature):
+                redefined = True
+                everything = _affected(self.signatures.get(f, []), signature,
+                                       affected) or everything
+            self._unindex(f)
+            self.scans[f] = scan
+            self.signatures[f] = signature
+            self._index(f)
+        self.files = [f for f in files if f in self.scans]
+
+        if (redefined):
+            self._define()
+        if (everything):
+            resolve = self.files
+        else: # the changed files and the files that mention a redefined name
+            stale = set([f for f in dirty if f in self.scans])
+            for name in affected:
+                stale.update(self.references.get(name, ()))
+            resolve = [f for f in self.files if f in stale]
+        for f in resolve:
+            calls = self.scans[f].resolve_scopes(self.table)
+            _changed(self.calls.get(f, {}), calls, changed)
+            self.calls[f] = calls
+        if (redefined):
+            dispatch = OrderedDict()
+            for k in self.interfaces.keys():
+                if (k in self.table.ignored): continue
+                dispatch[k] = [[sid, "i"] for sid in self.table.specifics(k)]
+            _changed(self.dispatch, dispatch, changed)
+            self.dispatch = dispatch
+
+        graph = CallGraph(self._resolved_calls())
+        if (self.graph is not None):
+            graph.inherit(self.graph, changed)
+        self.graph = graph
+        self.generation += 1
+        return True
+
+    def _index(self, filename):
+        """
+        Add the names a file mentions to the inverted index
+        """
+        names = _mentions(self.scans[filename])
+        self.mentions[filename] = names
+        for name in names:
+            self.references.setdefault(name, set()).add(filename)
+
+    def _unindex(self, filename):
+        """
+        Remove the names a file mentions from the inverted index
+        """
+        for name in self.mentions.pop(filename, ()):
+            files = self.references[name]
+            files.discard(filename)
+            if (len(files) == 0):
+                del self.references[name]
+
+    def _define(self):
+        """
+        Build the symbol table from all scans
+        """
+        self.table = SymbolTable()
+        for f in self.files:
+            self.table.add_scan(self.scans[f])
+        for name in self.ignore:
+            self.table.ignore(name)
+        self.interfaces = OrderedDict()
+        for k in self.table.procedures():
+            if (self.table.scopes[k].kind == "interface"):
+                self.interfaces[k] = self.table.scopes[k].specifics
+
+    def _resolved_calls(self):
+        """
+        Generate the (routine_id, [calls]) pairs of every file, followed by the
+        dispatch of each generic interface to its specific procedures
+        """
+        for f in self.files:
+            c = self.calls[f]
+            for k in c.keys():
+                yield k, c[k]
+        for k in self.dispatch.keys():
+            yield k, self.dispatch[k]
+
+    def programs(self):
+        """
+        Return the ids of all programs in the order the files were walked
+        """
+        programs = []
+        for f in self.files:
+            programs += self.scans[f].programs
+        return programs
+
+    def find(self, key):
+        """
+        Return the ids of the routines in the graph that match the key, either
+        an id or a bare name, see SymbolTable.find
+        """
+        return [sid for sid in self.table.find(key) if sid in self.graph.ids]
+
+def _signature(scan):
+    """
+    Return everything in a scan that the resolution of other files depends on:
+    the scopes with their names and uses, the specifics of every interface and
+    the accessibility of the module entities
+    """
+    signature = []
+    for scope in scan.scopes.values():
+        uses = [(module, None if (only is None) else sorted(only), sorted(renames.items()))
+                for module, only, renames in scope.uses]
+        signature.append((scope.id, scope.kind, scope.name, uses, list(scope.specifics),
+                          sorted(scope.access.items()), scope.private))
+    return signature
+
+def _affected(old, new, affected):
+    """
+    Compare the old and new signature of a file and add the names of the
+    scopes that were added, removed or changed to the affected set
+
+    Returns
+    -------
+    everything : bool
+        True if a module was added, removed or changed, which can change the
+        resolution of any name in any file that uses it
+    """
+    old = dict([(s[0], s) for s in old])
+    new = dict([(s[0], s) for s in new])
+    for sid in set(old.keys()) | set(new.keys()):
+        before = old.get(sid)
+        after  = new.get(sid)
+        if (before == after):
+            continue
+        if ("module" in [s[1] for s in [before, after] if (s is not None)]):
+            return True
+        for s in [before, after]:
+            if (s is not None):
+                affected.add(s[2])
+    return False
+
+def _changed(old, new, changed):
+    """
+    Compare the old and new calls of the routines of a file and add the ids
+    of the routines whose callees, or their order, changed to the changed set.
+    The line numbers of the calls are not compared
+    """
+    for k in set(old.keys()) | set(new.keys()):
+        if (_callees(old.get(k, ())) != _callees(new.get(k, ()))):
+            changed.add(k)
+
+def _callees(calls):
+    """
+    Return the distinct callees in the order of their first call
+    """
+    seen = set()
+    callees = []
+    for c in calls:
+        if (c[0] not in seen):
+            seen.add(c[0])
+            callees.append(c[0])
+    return callees
+
+def _mentions(scan):
+    """
+    Return the names a file mentions: every call candidate, resolved or not,
+    and the remote names of its renaming use statements
+    """
+    names = set()
+    for sid in scan.candidates.keys():
+        for name, ctype, lineno in scan.candidates[sid]:
+            names.add(name)
+    for scope in scan.scopes.values():
+        for module, only, renames in scope.uses:
+            names.update(renames.values())
+    return names
@@ -0,0 +1,255 @@
+"""
+Questions about the call graph of a project, shared by the server and the CLI
+
+Every query is a dictionary with a "cmd" and, depending on the command, more
+arguments. Names are either bare routine names or ids such as "module::name",
+a bare name that is defined several times matches every definition:
+
+    {"cmd":"stats"}
+    {"cmd":"cycles"}
+    {"cmd":"callees", "name":"setup", "transitive":false}
+    {"cmd":"callers", "name":"setup", "transitive":false}
+    {"cmd":"tree", "name":"driver"}
+    {"cmd":"tree", "name":"driver", "depth":3, "prune":["mpi_*"], "collapse":true,
+     "limit":100, "cursor":0}
+    {"cmd":"path", "name":"driver", "target":"mpi_abort"}
+    {"cmd":"dead", "roots":["driver"]}     # the roots default to all programs,
+                                           # see SymbolTable.roots
+
+The transitive queries, the paths and the dead routines are answered with a
+breadth first search over the forward or the reverse calls of the graph, each
+linear in the part of the graph it walks and with one byte of scratch space
+per routine. The latest shortest paths are remembered.
+
+A tree can be limited to a depth, pruned by routine or module patterns, see
+utilities.CompileRoutinePatterns, and fetched page by page: with a "limit"
+the answer is {"lines":[...], "cursor":n}, ask again with that cursor for the
+next page, the cursor is None after the last page. The tree of the previous
+page is resumed where it stopped, so a page costs what it shows.
+
+Examples
+--------
+>>> project = Project("/path/to/source", include_ext=["F90"])
+>>> project.refresh()
+>>> Answer(project, {"cmd":"callers", "name":"mpi_abort", "transitive":True})
+{'mpi_abort': ['driver', 'solver::fail', 'utils::check_err']}
+"""
+from __future__ import print_function
+from collections import OrderedDict
+from itertools import chain, islice
+from graph import FormatNode
+from utilities import CompileRoutinePatterns
+
+# the commands that Answer understands
+COMMANDS = ("stats", "cycles", "callees", "callers", "tree", "path", "dead")
+
+# the trees of the latest pages, resumed by the next page, see _page
+PAGES    = 16
+_pages   = OrderedDict() # (project, generation, query, cursor):(nodes, pending)
+
+def Answer(project, request):
+    """
+    Answer a single query
+
+    Args
+    ----
+    project : Project
+        The refreshed project, see project.Project
+    request : dict
+        The query, see the module docstring
+
+    Returns
+    -------
+    result : dict or list
+        The answer, only made of strings, numbers, lists and dictionaries so it
+        can be sent as JSON. A ValueError is raised for a bad query
+    """
+    cmd = request.get("cmd")
+    graph = project.graph
+    if (cmd == "stats"):
+        return {"files":len(project.files), "routines":len(graph),
+                "calls":len(graph.targets), "generation":project.generation}
+    if (cmd == "cycles"):
+        return [list(c) for c in graph.cycles()]
+    if (cmd == "dead"):
+        roots = request.get("roots")
+        if (roots is None): # all programs, or the entry points of a library
+            roots = [r for r in project.table.roots(["programs"]) if r in graph.ids]
+            if (len(roots) == 0):
+                roots = [r for r in project.table.roots(["public"]) if r in graph.ids]
+        else:
+            roots = [r for r in project.table.roots(roots) if r in graph.ids]
+        if (len(roots) == 0):
+            raise ValueError("dead needs at least one root, none was found")
+        return graph.unreachable(roots)
+
+    if (cmd not in COMMANDS):
+        raise ValueError("unknown command: {}".format(cmd))
+    name = request.get("name")
+    if (name is None):
+        raise ValueError("{} needs a name".format(cmd))
+    ids = _find(project, [name])
+
+    if (cmd in ["callees", "callers"]):
+        result = {}
+        for sid in ids:
+            if (request.get("transitive")):
+                if (cmd == "callees"):
+                    result[sid] = sorted(graph.reachable(sid))
+                else:
+                    result[sid] = sorted(graph.ancestors(sid))
+            elif (cmd == "callees"):
+                result[sid] = graph.callees(sid)
+            else:
+                result[sid] = graph.called_by(sid)
+        return result
+
+    if (cmd == "path"):
+        target = request.get("target")
+        if (target is None):
+            raise ValueError("path needs a target")
+        shortest = None
+        for t in _find(project, [target]):
+            for sid in ids:
+                p = graph.path(sid, t)
+                if ((p is not None) and ((shortest is None) or (len(p) < len(shortest)))):
+                    shortest = p
+        if (shortest is None):
+            return []
+        return shortest
+
+    # the calling tree
+    label = project.table.label
+    max_depth = request.get("depth")
+    prune = request.get("prune") or []
+    collapse = request.get("collapse", True)
+    def nodes():
+        return graph.forest(ids, max_depth, CompileRoutinePatterns(prune), collapse)
+    def lines(page):
+        return [FormatNode(depth, label(n), repeat, [label(m) for m in cycle], hidden)
+                for depth, n, repeat, cycle, hidden in page]
+
+    limit = request.get("limit")
+    if (limit is None):
+        return lines(nodes())
+    key = (id(project), project.generation, tuple(ids), max_depth, tuple(prune), collapse)
+    page, cursor = _page(key, nodes, int(request.get("cursor") or 0), int(limit))
+    return {"lines":lines(page), "cursor":cursor}
+
+def _page(key, nodes, cursor, limit):
+    """
+    Return the page of limit nodes that starts at the cursor and the cursor of
+    the next page, None after the last page. The generator of the previous
+    page is resumed if it is still kept, otherwise nodes() is called and the
+    nodes before the cursor are skipped
+    """
+    entry = _pages.pop(key + (cursor,), None)
+    if (entry is None):
+        it = nodes()
+        pending = list(islice(it, cursor, cursor+1)) # skip to the cursor
+    else:
+        it, pending = entry
+    page = list(islice(chain(pending, it), limit+1))
+    if (len(page) <= limit):
+        return page, None
+    _pages[key + (cursor+limit,)] = (it, page[limit:])
+    while (len(_pages) > PAGES):
+        _pages.popitem(last=False)
+    return page[:limit], cursor+limit
+
+def _find(project, names):
+    """
+    Return the ids that match any of the names, a ValueError is raised if a
+    name does not match any routine
+    """
+    ids = []
+    for name in names:
+        found = project.find(name)
+        if (len(found) == 0):
+            raise ValueError("unknown routine: {}".format(name))
+        ids += found
+    return ids
+
+def Print(result):
+    """
+    Print the answer of a query in a plain text form
+    """
+    if (isinstance(result, dict)):
+        for k in sorted(result.keys()):
+            if (isinstance(result[k], list)):
+                print("{}:".format(k))
+                for v in result[k]:
+                    print("\t{}".format(v))
+            else:
+                print("{}: {}".format(k, result[k]))
+    elif (isinstance(result, list)):
+        for v in result:
+            if (isinstance(v, list)):
+                v = ", ".join(v)
+            print(v)
+    else:
+        print(result)
+
+def Run(request, directory, socket_path=None, include_ext=[], exclude_dirs=[], ignore=[],
+        jobs=1, cache=None, include=[], exclude=[], walkers=1):
+    """
+    Answer a query and print the result. A server that is listening on the
+    socket answers the query, otherwise the source tree is parsed first. The
+    tree is also parsed if the socket is left over from a server that was
+    killed, i.e., nothing accepts the connection
+
+    Args
+    ----
+    request : dict
+        The query, see the module docstring
+    directory : str
+        Path to the directory that holds the source code
+    socket_path : str, optional
+        The socket of the server, see server.DefaultSocket
+    include_ext, exclude_dirs, ignore, jobs, cache, include, exclude, walkers : optional
+        See project.Project, only used if no server is listening
+
+    Returns
+    -------
+    ok : bool
+        False if the query failed
+    """
+    import os
+    import errno
+    import socket
+    import server
+    from project import Project
+
+    if (socket_path is None):
+        socket_path = server.DefaultSocket(directory)
+    if (os.path.exists(socket_path)):
+        options = dict(request)
+        cmd = options.pop("cmd"); name = options.pop("name", None)
+        try:
+            response = server.Request(socket_path, cmd, name, **options)
+        except socket.error as e:
+            if (e.errno not in [errno.ECONNREFUSED, errno.ENOENT]):
+                print("ERROR: no server is listening on {}: {}".format(socket_path, e))
+                return False
+            response = None # a stale socket, nobody is listening
+        if (response is not None):
+            if (not response["ok"]):
+                print("ERROR: {}".format(response["error"]))
+                return False
+            Print(response["result"])
+            return True
+
+    project = Project(directory, include_ext=include_ext, exclude_dirs=exclude_dirs,
+                      ignore=ignore, jobs=jobs, cache=cache, include=include,
+                      exclude=exclude, walkers=walkers)
+    project.refresh()
+    if (cache is not None):
+        cache.prune(project.files)
+        cache.close()
+    try:
+        result = Answer(project, request)
+    except ValueError as e:
+        print("ERROR: {}".format(e))
+        return False
+    Print(result)
+    return True
@@ -0,0 +1,241 @@
+"""
+Long running server that keeps the call graph of a source tree in memory
+
+The server listens on a Unix socket and answers one JSON request per line with
+one JSON response per line. A background thread polls the source tree and
+rescans the files that changed, so every answer reflects the current tree
+without paying for a full parse.
+
+Requests are objects with a "cmd" and, depending on the command, a "name":
+
+    {"cmd":"ping"}                        --> "pong"
+    {"cmd":"stats"}                       --> files, routines, calls, generation
+    {"cmd":"refresh"}                     --> true if the graph was rebuilt
+    {"cmd":"callees", "name":"setup"}     --> {routine_id:[ids of the callees]}
+    {"cmd":"callers", "name":"setup"}     --> {routine_id:[ids of the callers]}
+    {"cmd":"tree", "name":"driver"}       --> [lines of the calling tree]
+    {"cmd":"cycles"}                      --> [[ids of each recursive cycle]]
+    {"cmd":"shutdown"}                    --> true, the server stops
+
+plus the path and dead queries and the transitive callers/callees, see
+queries.Answer for all of them.
+
+Responses are {"ok":true, "result":...} or {"ok":false, "error":"message"}.
+
+Examples
+--------
+>>> Serve("/path/to/source", socket_path="/tmp/f90tree.sock")     # blocks
+>>> Request("/tmp/f90tree.sock", "callers", "setup")
+{'ok': True, 'result': {'utils::setup': ['driver']}}
+"""
+from __future__ import print_function
+import os
+import json
+import time
+import socket
+import threading
+try:
+    import socketserver
+except ImportError: # python 2
+    import SocketServer as socketserver
+from queries import Answer, Print
+
+class Handler(socketserver.StreamRequestHandler):
+    """
+    Answer every request line of a single connection
+    """
+
+    def handle(self):
+        for line in iter(self.rfile.readline, b""):
+            if (line.strip() == b""): continue
+            try:
+                request = json.loads(line.decode("utf-8"))
+                response = {"ok":True, "result":self.server.answer(request)}
+            except Exception as e:
+                response = {"ok":False, "error":str(e)}
+            self.wfile.write((json.dumps(response)+"\n").encode("utf-8"))
+            self.wfile.flush()
+            if (self.server.stopping): # the response to shutdown was sent
+                threading.Thread(target=self.server.shutdown).start()
+                break
+
+class Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """
+    Threaded Unix socket server around a Project
+
+    Args
+    ----
+    socket_path : str
+        The filename of the Unix socket
+    project : Project
+        The source tree, it is refreshed before the server starts listening
+    interval : float, optional
+        Seconds between two polls of the source tree
+    """
+
+    daemon_threads = True
+
+    def __init__(self, socket_path, project, interval=2.0):
+        self.project  = project
+        self.interval = interval
+        self.lock     = threading.Lock() # guards the project
+        self.stopping = False
+        self.project.refresh()
+        socketserver.UnixStreamServer.__init__(self, socket_path, Handler)
+
+    def watch(self):
+        """
+        Poll the source tree until the server stops, run in a background thread
+        """
+        while (not self.stopping):
+            try:
+                with self.lock:
+                    if (self.project.refresh()):
+                        print("\trefreshed, generation {}".format(self.project.generation))
+            except Exception as e: # keep serving the last good graph
+                print("\tERROR: refresh failed: {}".format(e))
+            for i in range(max(1, int(self.interval*10))):
+                if (self.stopping): break
+                time.sleep(0.1)
+
+    def answer(self, request):
+        """
+        Return the result of a single decoded request
+        """
+        cmd = request.get("cmd")
+        if (cmd == "ping"):
+            return "pong"
+        if (cmd == "shutdown"):
+            self.stopping = True
+            return True
+
+        with self.lock:
+            if (cmd == "refresh"):
+                return self.project.refresh()
+            return Answer(self.project, request)
+
+def Serve(directory, include_ext=[], exclude_dirs=[], ignore=[], jobs=1, cache=None,
+          socket_path=None, interval=2.0, verbose=False, include=[], exclude=[], walkers=1):
+    """
+    Parse the source tree and answer requests until a shutdown request arrives
+
+    Args
+    ----
+    directory : str
+        Path to the directory that holds the source code
+    include_ext, exclude_dirs, ignore, jobs, cache, verbose, include, exclude, walkers : optional
+        See project.Project
+    socket_path : str, optional
+        The filename of the Unix socket, defaults to .f90tree/daemon.sock under
+        the source directory
+    interval : float, optional
+        Seconds between two polls of the source tree
+    """
+    if (socket_path is None):
+        socket_path = DefaultSocket(directory)
+    if (os.path.exists(socket_path)):
+        try:
+            Request(socket_path, "ping")
+        except socket.error: # left behind by a server that died
+            os.remove(socket_path)
+        else:
+            print("\nERROR: a server is already listening on {}\n".format(socket_path))
+            return
+    elif (not os.path.isdir(os.path.dirname(os.path.abspath(socket_path)))):
+        os.makedirs(os.path.dirname(os.path.abspath(socket_path)))
+
+    from project import Project # the clients never parse anything
+    # never scan the socket or the cache of the server itself
+    exclude_dirs = list(exclude_dirs) + [".f90tree"]
+    project = Project(directory, include_ext=include_ext, exclude_dirs=exclude_dirs,
+                      ignore=ignore, jobs=jobs, cache=cache, verbose=verbose,
+                      include=include, exclude=exclude, walkers=walkers)
+    print("\nParsing {}".format(directory))
+    server = Server(socket_path, project, interval=interval)
+    if (cache is not None): # sqlite connections can not be shared with the watcher
+        cache.prune(project.files)
+        cache.close()
+        project.cache = None
+    print("\tListening on {}, {} files, {} routines".format(socket_path,
+          len(project.files), len(project.graph)))
+
+    watcher = threading.Thread(target=server.watch)
+    watcher.daemon = True
+    watcher.start()
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.stopping = True
+        server.server_close()
+        if (os.path.exists(socket_path)):
+            os.remove(socket_path)
+        print("\tServer stopped")
+
+def Request(socket_path, cmd, name=None, **options):
+    """
+    Send a single request to a running server
+
+    Args
+    ----
+    socket_path : str
+        The filename of the Unix socket of the server
+    cmd : str
+        The command, see the module docstring
+    name : str, optional
+        The routine name or id used by the callees, callers, tree and path
+        commands
+    options : optional
+        Any other arguments of the request, e.g., transitive=True or target=...
+
+    Returns
+    -------
+    response : dict
+        The decoded response, {"ok":..., "result":...} or {"ok":..., "error":...}
+    """
+    request = {"cmd":cmd}
+    request.update(options)
+    if (name is not None):
+        request["name"] = name
+    s = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        s.connect(socket_path)
+        mf = s.makefile("rwb")
+        mf.write((json.dumps(request)+"\n").encode("utf-8"))
+        mf.flush()
+        line = mf.readline()
+        mf.close()
+    finally:
+        s.close()
+    if (line == b""):
+        raise socket.error("the server closed the connection")
+    return json.loads(line.decode("utf-8"))
+
+def Query(socket_path, cmd, name=None, **options):
+    """
+    Send a single request to a running server and print the result, see
+    Request for the arguments
+
+    Returns
+    -------
+    ok : bool
+        False if the server could not be reached or the request failed
+    """
+    try:
+        response = Request(socket_path, cmd, name, **options)
+    except socket.error as e:
+        print("ERROR: no server is listening on {}: {}".format(socket_path, e))
+        return False
+    if (not response["ok"]):
+        print("ERROR: {}".format(response["error"]))
+        return False
+
+    Print(response["result"])
+    return True
+
+def DefaultSocket(directory):
+    """
+    Return the default socket filename of the server of the given source tree
+    """
+    return os.path.join(directory, ".f90tree", "daemon.sock")
@@ -0,0 +1,362 @@
+"""
+Scoped symbol table used to resolve calls to the routine that is actually called
+
+Every module, program, procedure and interface is a scope with a unique id.
+Module procedures are named "module::name" and internal procedures are named
+"host::name", external procedures and programs keep their bare name. Generic
+interfaces have a namespace of their own, "module::interface:name", as a
+specific procedure may have the same name as its generic interface.
+
+Examples
+--------
+>>> table = SymbolTable()
+>>> for scan in scans:
+>>>     table.add_scan(scan)
+>>> table.resolve("driver", "setup")   # called from within program driver
+'utils::setup'
+"""
+from names import NameIndex
+
+# the prefix of the bare name in the id of a generic interface
+GENERIC = "interface:"
+
+class Scope(object):
+    """
+    A module, program, function, subroutine or interface
+
+    Args
+    ----
+    kind : str
+        One of "module", "program", "function", "subroutine" or "interface"
+    name : str
+        The bare name as it appears in the source
+    parent : str, optional
+        The id of the host scope, None for modules, programs and external procedures
+    filename : str, optional
+        The file that holds the definition
+    """
+
+    def __init__(self, kind, name, parent=None, filename=None):
+        self.kind      = kind
+        self.name      = name
+        self.parent    = parent
+        self.filename  = filename
+        self.uses      = [] # list of (module, only, renames) tuples, see lexer.ParseUse
+        self.children  = {} # name:id pairs of the procedures/interfaces defined in this scope
+        self.specifics = [] # for interfaces, the names of the specific procedures
+        self.access    = {} # for modules, name:"public"/"private" pairs of access statements
+        self.private   = False # for modules, True if the default accessibility is private
+
+    @property
+    def id(self):
+        name = self.name
+        if (self.kind == "interface"):
+            name = GENERIC + name
+        if (self.parent is None):
+            return name
+        return self.parent + NameIndex.separator + name
+
+    def __repr__(self):
+        return "Scope({}, {})".format(self.kind, self.id)
+
+    def is_public(self, name):
+        """
+        Return True if the named entity of this module is accessible from
+        outside of the module
+        """
+        default = "private" if (self.private) else "public"
+        return self.access.get(name, default) == "public"
+
+class SymbolTable(object):
+    """
+    Index of every scope found in the source tree
+
+    Name resolution follows the Fortran rules: a name is looked up in the
+    calling scope, its use statements, then each host scope in turn and
+    finally in the global namespace of external procedures. Resolution is
+    lazy and every (scope, name) result is memoized, so each lookup is a
+    handful of dictionary accesses no matter how many procedures exist.
+    """
+
+    def __init__(self):
+        self.scopes     = {} # id:Scope pairs
+        self.globals    = {} # name:id pairs of programs, external procedures and interfaces
+        self.modules    = {} # name:id pairs of modules
+        self.ignored    = set()
+        self._resolved  = {} # memoized (scope id, name):id pairs
+        self._exports   = {} # memoized (module, name):id pairs
+        self._specifics = {} # memoized interface id:[ids of the specific procedures]
+        self._labels    = None
+
+    def add_scan(self, scan):
+        """
+        Add all scopes found in a single file, see parsers.FileScan
+        """
+        for sid in scan.scopes.keys():
+            self.add(scan.scopes[sid])
+
+    def add(self, scope):
+        """
+        Add a single scope
+        """
+        sid = scope.id
+        self.scopes[sid] = scope
+        if (scope.kind == "module"):
+            self.modules[scope.name] = sid
+        elif (scope.parent is None):
+            self._bind(self.globals, scope)
+        else:
+            parent = self.scopes.get(scope.parent)
+            if (parent is not None):
+                self._bind(parent.children, scope)
+        self._resolved  = {}
+        self._exports   = {}
+        self._specifics = {}
+        self._labels    = None
+
+    def _bind(self, names, scope):
+        """
+        Map the name of a scope to its id in the given name:id pairs. A call
+        to a name goes to the generic interface, it is not replaced by a
+        specific procedure of the same name
+        """
+        old = self.scopes.get(names.get(scope.name))
+        if ((old is None) or (old.kind != "interface") or (scope.kind == "interface")):
+            names[scope.name] = scope.id
+
+    def find(self, key):
+        """
+        Return the list of ids that match the key, the key is either an id or a
+        bare name, in which case every scope with that name matches
+        """
+        key = key.lower()
+        if ((key in self.scopes) and (self.scopes[key].kind != "module")):
+            return [key]
+        return [sid for sid in self.scopes.keys()
+                if (self.scopes[sid].name == key) and (self.scopes[sid].kind != "module")]
+
+    def ignore(self, key):
+        """
+        Exclude every scope matching the key from the resolution, see find
+        """
+        self.ignored.update(self.find(key))
+        self._resolved  = {}
+        self._exports   = {}
+        self._specifics = {}
+
+    def procedures(self):
+        """
+        Return the ids of all programs, functions, subroutines and interfaces
+        """
+        return [sid for sid in self.scopes.keys() if self.scopes[sid].kind != "module"]
+
+    def programs(self):
+        """
+        Return the ids of all programs
+        """
+        return [sid for sid in self.scopes.keys() if self.scopes[sid].kind == "program"]
+
+    def public(self):
+        """
+        Return the ids of the public procedures and generic interfaces of every
+        module, i.e., the entry points of a library
+        """
+        ids = set()
+        for mid in self.modules.values():
+            module = self.scopes[mid]
+            for name in module.children.keys():
+                if (module.is_public(name)):
+                    ids.add(module.children[name])
+        return [sid for sid in self.scopes.keys() if sid in ids] # in definition order
+
+    def roots(self, keys):
+        """
+        Return the ids of the routines where the calling trees begin
+
+        Args
+        ----
+        keys : list
+            Each key is "programs" for all programs, "public" for all public
+            module procedures, or an id or bare name, see find
+
+        Returns
+        -------
+        ids : list
+            The matching ids in the order of the keys, each id is listed once
+            and ignored routines are left out
+        """
+        ids = []
+        for key in keys:
+            if (key == "programs"):
+                ids += self.programs()
+            elif (key == "public"):
+                ids += self.public()
+            else:
+                ids += self.find(key)
+        roots = []
+        seen = set()
+        for sid in ids:
+            if ((sid not in seen) and (sid not in self.ignored)):
+                seen.add(sid)
+                roots.append(sid)
+        return roots
+
+    def resolve(self, scope_id, name):
+        """
+        Resolve a name used inside the given scope
+
+        Args
+        ----
+        scope_id : str
+            The id of the scope that makes the call
+        name : str
+            The bare name that is called
+
+        Returns
+        -------
+        sid : str
+            The id of the called scope, None if the name is not a known routine,
+            e.g., an array or an intrinsic, or if it was ignored
+        """
+        key = (scope_id, name)
+        if (key in self._resolved):
+            return self._resolved[key]
+
+        sid = None
+        s = self.scopes.get(scope_id)
+        while (s is not None): # local scope first, then each host
+            if (name in s.children):
+                sid = s.children[name]
+                break
+            if ((name == s.name) and (s.kind in ["function", "subroutine"])):
+                sid = s.id # recursive call
+                break
+            sid = self._use(s, name)
+            if (sid is not None):
+                break
+            s = self.scopes.get(s.parent) if (s.parent is not None) else None
+        else:
+            sid = self.globals.get(name)
+
+        if (sid in self.ignored):
+            sid = None
+        self._resolved[key] = sid
+        return sid
+
+    def specifics(self, interface_id):
+        """
+        Return the ids of the specific procedures of a generic interface
+
+        The specific names are resolved in the scope that holds the interface,
+        the result is computed once per interface and shared by every call
+        to the generic name
+
+        Args
+        ----
+        interface_id : str
+            The id of the interface
+
+        Returns
+        -------
+        ids : list
+            The ids of the specific procedures that could be called, names that
+            could not be resolved or that were ignored are left out
+        """
+        if (interface_id in self._specifics):
+            return self._specifics[interface_id]
+
+        scope = self.scopes[interface_id]
+        ids = []
+        for name in scope.specifics:
+            if (scope.parent is not None):
+                sid = self.resolve(scope.parent, name)
+            else:
+                sid = self.globals.get(name)
+            if ((sid is not None) and (self.scopes[sid].kind == "interface")):
+                sid = self._procedure(sid) # the specific that shares the generic name
+            if ((sid is not None) and (sid not in self.ignored)):
+                ids.append(sid)
+
+        self._specifics[interface_id] = ids
+        return ids
+
+    def _procedure(self, interface_id):
+        """
+        Return the id of the function or subroutine that has the same name as
+        the given generic interface and is defined in the same scope, None if
+        there is none
+        """
+        scope = self.scopes[interface_id]
+        sid = scope.name
+        if (scope.parent is not None):
+            sid = scope.parent + NameIndex.separator + sid
+        procedure = self.scopes.get(sid)
+        if ((procedure is None) or (procedure.kind not in ["function", "subroutine"])):
+            return None
+        return sid
+
+    def _use(self, scope, name, active=None):
+        """
+        Resolve a name through the use statements of the given scope
+        """
+        for module, only, renames in scope.uses:
+            if (name in renames):
+                remote = renames[name]
+            elif (only is not None):
+                if (name not in only): continue
+                remote = name
+            else:
+                remote = name
+            sid = self.export(module, remote, active)
+            if (sid is not None):
+                return sid
+        return None
+
+    def export(self, module, name, active=None):
+        """
+        Return the id of the named routine that is accessible from the given
+        module, either defined in it or use associated through it. Private
+        entities, by an access statement or by the default accessibility of
+        the module, are not exported
+        """
+        key = (module, name)
+        if (key in self._exports):
+            return self._exports[key]
+
+        scope = self.scopes.get(self.modules.get(module))
+        if (scope is None): # unknown module, e.g., an intrinsic module or a library
+            return None
+
+        if (not scope.is_public(name)):
+            sid = None
+        elif (name in scope.children):
+            sid = scope.children[name]
+        else:
+            if (active is None):
+                active = set()
+            if (module in active): # modules that use each other
+                return None
+            active.add(module)
+            sid = self._use(scope, name, active)
+            active.discard(module)
+
+        self._exports[key] = sid
+        return sid
+
+    def label(self, sid):
+        """
+        Return the display name of the given id, the bare name is used unless
+        several routines share it, in which case the full id is used
+        """
+        if (self._labels is None):
+            counts = {}
+            for s in self.scopes.values():
+                if (s.kind != "module"):
+                    counts[s.name] = counts.get(s.name, 0) + 1
+            self._labels = counts
+        scope = self.scopes.get(sid)
+        if (scope is None):
+            return sid
+        if (self._labels.get(scope.name, 0) > 1):
+            return sid
+        return scope.name
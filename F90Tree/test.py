@@ -3,39 +3,184 @@ F90Tree module interface
 
 Usage:
     F90Tree [options] <source_directory>
+    F90Tree serve [options] <source_directory>
+    F90Tree query [options] <source_directory> <command> [<name>] [<target>]
+    F90Tree (callers | callees) [options] <source_directory> <name>
+    F90Tree path [options] <source_directory> <name> <target>
+    F90Tree dead [options] <source_directory> [<name>...]
 
 Options:
-    --ext=<e>         Comma separated list of file extensions [default: F90]
-    --exclude=<d>     Comma separated list of directories to exclude
+    --ext=<e>         Comma separated list of file extensions, not case
+                      sensitive, "fortran" for all Fortran extensions
+                      [default: F90]
+    --exclude=<d>     Comma separated list of directories to exclude, names,
+                      globs such as "src/*/tmp" or "re:<regular expression>"
+    --include=<g>     Comma separated list of file patterns, only the files
+                      that match one of them are parsed, e.g., "*_mod.f90"
+    --skip=<g>        Comma separated list of file patterns to skip
+    --walkers=<n>     Number of threads that walk the directory tree, more
+                      than one helps on network filesystems [default: 1]
+    --mmap            Memory map every file and skip comments and lines that
+                      can not hold a definition or a call as bytes, by default
+                      only files of 1 MB and more are mapped
     --verbose         Verbose [default: False]
-    --output=<o>      Save results to file in html format
-    --rec-limit=<r>   Set the recursion depth limit
+    --output=<o>      Save results to file
+    --format=<f>      Output format: text, jsonl, dot, graphml or adjacency,
+                      guessed from the --output extension if not given
     --ignore=<f>      Comma separated list of routine names to exclude
+    --root=<r>        Comma separated list of routine names where the trees
+                      begin, "programs" for all programs and "public" for all
+                      public module procedures [default: programs]
+    --depth=<n>       Do not expand the calling trees below this depth
+    --prune=<p>       Comma separated list of routine or module patterns, the
+                      matching routines and their calls are not shown, e.g.,
+                      "mpi_*", a module name or "re:<regular expression>"
+    --expand-repeats  Write every subtree in full instead of "(see above)"
+    --start=<n>       Write the calling trees from this node on, the cursor
+                      of the next page of a tree query [default: 0]
+    --limit=<n>       Write at most this many nodes of the calling trees
+    --stats=<s>       Save the fan-in and fan-out distributions, the depths,
+                      the recursive cycles and the hub routines as JSON to <s>
+    --jobs=<n>        Number of processes used to scan the files [default: 1]
+    --cache           Cache the scan results under <source_directory>/.f90tree
+    --cache-dir=<c>   Cache the scan results under the given directory
+    --hash            Validate cached scan results with a content hash
+    --socket=<s>      Unix socket of the server, defaults to
+                      <source_directory>/.f90tree/daemon.sock
+    --interval=<t>    Seconds between two polls of the source tree [default: 2]
+    --transitive      Report the indirect callers/callees as well
+    --profile=<p>     Time the phases and the scan of every file, print a
+                      summary and save the measurements as JSON to <p>
+    --profile-python  Profile the run with cProfile, implies a profile summary
+    --profile-memory  Trace the memory with tracemalloc, implies a profile
+                      summary
+
+Commands:
+    serve             Keep the call graph in memory and answer queries over
+                      the socket, changed files are rescanned automatically
+    query             Ask the running server, <command> is one of ping, stats,
+                      refresh, callees, callers, tree, path, dead, cycles or
+                      shutdown
+    callers           The routines that call <name>
+    callees           The routines called by <name>
+    path              The shortest calling path from <name> to <target>
+    dead              The routines that are never called from the roots, the
+                      roots are the given names or all programs
+
+    The callers, callees, path and dead commands ask the server if one is
+    listening on the socket, otherwise the source tree is parsed first.
 """
 from __future__ import print_function
 
 if __name__ == "__main__":
 
+    import os
+    import sys
     from docopt import docopt
-    #from F90Tree import main
-    import main
 
     args = docopt(__doc__)
 
     directory = args["<source_directory>"]
+
+    socket_path = args["--socket"]
+    if (socket_path is None):
+        socket_path = os.path.join(directory, ".f90tree", "daemon.sock")
+    if (args["query"]): # keep the client light, nothing is parsed
+        import server
+        options = {}
+        if (args["--transitive"]):
+            options["transitive"] = True
+        if (args["<target>"] is not None):
+            options["target"] = args["<target>"]
+        if (args["--depth"] is not None):
+            options["depth"] = int(args["--depth"])
+        if (args["--prune"] is not None):
+            options["prune"] = args["--prune"].split(",")
+        if (args["--expand-repeats"]):
+            options["collapse"] = False
+        if (args["--limit"] is not None):
+            options["limit"] = int(args["--limit"])
+            options["cursor"] = int(args["--start"])
+        name = args["<name>"][0] if (len(args["<name>"]) > 0) else None
+        ok = server.Query(socket_path, args["<command>"], name, **options)
+        sys.exit(0 if ok else 1)
+
     ext = args["--ext"].split(",")
     exclude = args["--exclude"]
     if (exclude is not None):
         exclude_dirs = exclude.split(",")
     else:
         exclude_dirs = []
+    include = args["--include"].split(",") if (args["--include"] is not None) else []
+    skip = args["--skip"].split(",") if (args["--skip"] is not None) else []
+    walkers = int(args["--walkers"])
     ign = args["--ignore"]
     if (ign is not None):
         ignore = ign.split(",")
     else:
         ignore = []
 
+    cache_dir = args["--cache-dir"]
+    if (args["--cache"] and (cache_dir is None)):
+        cache_dir = os.path.join(directory, ".f90tree")
+
+    if (args["callers"] or args["callees"] or args["path"] or args["dead"]):
+        import queries
+        from cache import ParseCache
+        if (args["dead"]):
+            request = {"cmd":"dead"}
+            if (len(args["<name>"]) > 0):
+                request["roots"] = args["<name>"]
+        else:
+            request = {"cmd":"callers" if args["callers"] else
+                              "callees" if args["callees"] else "path",
+                       "name":args["<name>"][0], "transitive":args["--transitive"]}
+            if (args["path"]):
+                request["target"] = args["<target>"]
+        if (cache_dir is not None):
+            cache = ParseCache(cache_dir, use_hash=args['--hash'])
+        else:
+            cache = None
+        ok = queries.Run(request, directory, socket_path=args["--socket"], include_ext=ext,
+                         exclude_dirs=exclude_dirs, ignore=ignore, jobs=int(args['--jobs']),
+                         cache=cache, include=include, exclude=skip, walkers=walkers)
+        sys.exit(0 if ok else 1)
+
+    if (args["serve"]):
+        import server
+        from cache import ParseCache
+        if (cache_dir is not None):
+            cache = ParseCache(cache_dir, use_hash=args['--hash'])
+        else:
+            cache = None
+        server.Serve(directory, include_ext=ext, exclude_dirs=exclude_dirs, ignore=ignore,
+                     jobs=int(args['--jobs']), cache=cache, socket_path=socket_path,
+                     interval=float(args['--interval']), verbose=args['--verbose'],
+                     include=include, exclude=skip, walkers=walkers)
+        sys.exit(0)
+
+    profile = None
+    if (args["--profile"] or args["--profile-python"] or args["--profile-memory"]):
+        from profiling import Profiler
+        profile = Profiler(cprofile=args["--profile-python"], memory=args["--profile-memory"])
+
+    #from F90Tree import main
+    import main
     main.Parse(directory, include_ext=ext, exclude_dirs=exclude_dirs, ignore=ignore,
-               verbose=args['--verbose'], output=args['--output'],
-               rec_limit=args['--rec-limit'])
+               roots=args['--root'].split(","),
+               verbose=args['--verbose'], output=args['--output'], fmt=args['--format'],
+               jobs=int(args['--jobs']), cache_dir=cache_dir, use_hash=args['--hash'],
+               include=include, exclude=skip, walkers=walkers, profile=profile,
+               mapped=True if args["--mmap"] else None,
+               max_depth=int(args["--depth"]) if (args["--depth"] is not None) else None,
+               prune=args["--prune"].split(",") if (args["--prune"] is not None) else [],
+               collapse=not args["--expand-repeats"], start=int(args["--start"]),
+               limit=int(args["--limit"]) if (args["--limit"] is not None) else None,
+               stats=args["--stats"])
+
+    if (profile is not None):
+        profile.summary()
+        if (args["--profile"] is not None):
+            profile.write(args["--profile"])
+            print("\nsaved profile to file = {}\n".format(args["--profile"]))
 
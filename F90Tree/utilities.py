@@ -2,51 +2,320 @@
 Various utility functions
 """
 import os
+import re
+import threading
+from fnmatch import fnmatchcase
+try:
+    import queue
+except ImportError: # python 2
+    import Queue as queue
+try:
+    from os import scandir
+except ImportError: # python 2, fall back to listdir & stat
+    scandir = None
 
-def treewalk(top_dir, include_ext=[], exclude_dirs=[]):
+# the extensions of Fortran source code, "fortran" in include_ext stands for all of them
+FORTRAN_EXTENSIONS = ("f", "for", "ftn", "f77", "fpp", "f90", "f95", "f03", "f08", "f18")
+
+def NormalizeExtensions(include_ext):
     """
-    Walk a directory tree and return full path of all files that were found.
+    Return the extensions as a tuple of lower case ".ext" suffixes
+
+    Extensions are compared without regard to case, so "F90", "f90" and ".f90"
+    are the same extension. The keyword "fortran" expands to every extension
+    in FORTRAN_EXTENSIONS
+
+    Examples
+    --------
+    >>> NormalizeExtensions(["F90", ".f"])
+    ('.f90', '.f')
+    """
+    extensions = []
+    for e in include_ext:
+        e = e.strip().lower().lstrip(".")
+        if (e == ""): continue
+        if (e == "fortran"):
+            new = FORTRAN_EXTENSIONS
+        else:
+            new = [e]
+        for n in new:
+            if ("." + n not in extensions):
+                extensions.append("." + n)
+    return tuple(extensions)
+
+def CompilePatterns(patterns):
+    """
+    Compile a list of path patterns into a single matching function
+
+    A pattern is either a glob, e.g., "*_test.f90" or "src/*/tmp", or a regular
+    expression when it starts with "re:", e.g., "re:^(old|tmp)_". A glob
+    without a "/" is matched against the basename, any other glob is matched
+    against the path relative to the top directory, a regular expression is
+    searched for in the relative path. "/" is the separator on every platform
+
+    Returns
+    -------
+    match : function
+        match(relative_path, basename) returns True if any pattern matches,
+        None if there are no patterns
+    """
+    names = []   # globs matched against the basename
+    paths = []   # globs matched against the relative path
+    regexs = []
+    for p in patterns:
+        p = p.strip()
+        if (p == ""): continue
+        if (p.startswith("re:")):
+            regexs.append(re.compile(p[3:]))
+        elif ("/" in p):
+            paths.append(p.strip("/"))
+        else:
+            names.append(p)
+    if (len(names) + len(paths) + len(regexs) == 0):
+        return None
+
+    def match(relpath, name):
+        for p in names:
+            if (fnmatchcase(name, p)): return True
+        for p in paths:
+            if (fnmatchcase(relpath, p)): return True
+        for r in regexs:
+            if (r.search(relpath)): return True
+        return False
+    return match
+
+def CompileRoutinePatterns(patterns, separator="::"):
+    """
+    Compile a list of routine patterns into a single matching function
+
+    A pattern is either a glob, e.g., "mpi_*", or a regular expression when it
+    starts with "re:", e.g., "re:^solver::". A glob is matched against every
+    part of a routine id, i.e., the module, the hosts and the bare name, so the
+    name of a module matches all of its routines. The bare name of a generic
+    interface is matched without its "interface:" prefix, see symbols.Scope.
+    A regular expression is searched for in the whole id. Routine ids are
+    lower case, so are the globs
+
+    Returns
+    -------
+    match : function
+        match(routine_id) returns True if any pattern matches, None if there
+        are no patterns
+    """
+    globs = []
+    regexs = []
+    for p in patterns:
+        p = p.strip()
+        if (p == ""): continue
+        if (p.startswith("re:")):
+            regexs.append(re.compile(p[3:]))
+        else:
+            globs.append(p.lower())
+    if (len(globs) + len(regexs) == 0):
+        return None
+
+    def match(sid):
+        for part in sid.split(separator):
+            part = part.rsplit(":", 1)[-1]
+            for p in globs:
+                if (fnmatchcase(part, p)): return True
+        for r in regexs:
+            if (r.search(sid)): return True
+        return False
+    return match
+
+def iterwalk(top_dir, include_ext=[], exclude_dirs=[], include=[], exclude=[], threads=1):
+    """
+    Walk a directory tree and generate the full path of every matching file
+
+    Paths are generated as soon as their directory was listed, so the files
+    can be processed while the walk continues. Only the files that pass the
+    filters are joined into a full path. Symbolic links to directories are
+    not followed, unreadable directories are skipped.
 
     Args
     ----
     top_dir : str
         The top directory where the search will begin
     include_ext : list, optional
-        List of file extensions to include, e.g., to find
-        all Fortran files `include_ext=["f90", "F90", "f", "F"]`
+        List of file extensions to include, see NormalizeExtensions, all files
+        are included if the list is empty
     exclude_dirs : list, optional
-
-        List of directories to exclude during the search. For example, to
-        exclude the `build` directory, `exclude_dirs=["build"]`
+        List of directory patterns to exclude during the search, e.g., "build"
+        excludes every directory named build, see CompilePatterns
+    include : list, optional
+        List of file patterns, only files that match one of them are included
+    exclude : list, optional
+        List of file patterns to exclude
+    threads : int, optional
+        Number of threads that list directories concurrently, more than one
+        pays off on network filesystems. With several threads the order of
+        the paths is not defined
 
     Returns
     -------
-    filelist : list
-        The resulting list of filenames
+    paths : generator
+        Generates the absolute path of every matching file
     """
-    if (len(include_ext) == 0):
-        include_all_files = True
-    else:
-        include_all_files = False
-        include_ext = tuple(include_ext)
-
-    filelist = []
-    for root, dirs, files in os.walk(top_dir):
+    top = os.path.abspath(top_dir)
+    extensions   = NormalizeExtensions(include_ext)
+    skip_dir     = CompilePatterns(exclude_dirs)
+    include_file = CompilePatterns(include)
+    exclude_file = CompilePatterns(exclude)
 
-        # remove the excluded directories
-        dirs[:] = [d for d in dirs if d not in exclude_dirs]
+    def visit(path, rel):
+        """
+        List a single directory, returns the subdirectories to walk as
+        (path, relative path) pairs and the matching files
+        """
+        subdirs = []
+        files = []
+        try:
+            dirs, names = _listdir(path)
+        except OSError: # unreadable or removed during the walk
+            return subdirs, files
+        dirs.sort()
+        names.sort()
+        prefix = rel + "/" if (rel != "") else ""
+        for d in dirs:
+            r = prefix + d
+            if ((skip_dir is None) or (not skip_dir(r, d))):
+                subdirs.append((os.path.join(path, d), r))
+        for f in names:
+            if ((len(extensions) > 0) and (not f.lower().endswith(extensions))):
+                continue
+            if ((include_file is not None) or (exclude_file is not None)):
+                r = prefix + f
+                if ((include_file is not None) and (not include_file(r, f))): continue
+                if ((exclude_file is not None) and (exclude_file(r, f))): continue
+            files.append(os.path.join(path, f))
+        return subdirs, files
 
-        # only include the correct file extensions
-        if (include_all_files):
+    if (threads <= 1):
+        stack = [(top, "")]
+        while (len(stack) > 0):
+            subdirs, files = visit(*stack.pop())
             for f in files:
-                _f = os.path.abspath(os.path.join(root, f))
-                filelist.append(_f)
-        else:
+                yield f
+            stack.extend(reversed(subdirs))
+        return
+
+    # a pool of threads shares a queue of directories, the files of each
+    # directory are handed back in one batch, None marks the end of the walk.
+    # An exception raised while listing a directory is handed back instead of
+    # the files and raised by the generator
+    dirs = queue.Queue()
+    out  = queue.Queue()
+    lock = threading.Lock()
+    pending = [1] # directories that were queued but not listed yet
+
+    def worker():
+        while True:
+            item = dirs.get()
+            if (item is None): return
+            subdirs = []
+            try:
+                subdirs, files = visit(*item)
+                # the files go out before the count drops, so the end of the
+                # walk can not overtake the files of a directory
+                out.put(files)
+            except Exception as e:
+                out.put(e)
+            finally: # the directory is done, even if it failed
+                with lock:
+                    pending[0] += len(subdirs) - 1
+                    done = (pending[0] == 0)
+                for s in subdirs:
+                    dirs.put(s)
+                if (done):
+                    out.put(None)
+
+    workers = [threading.Thread(target=worker) for i in range(threads)]
+    for w in workers:
+        w.daemon = True
+        w.start()
+    dirs.put((top, ""))
+    try:
+        while True:
+            files = out.get()
+            if (files is None): break
+            if (isinstance(files, Exception)):
+                raise files
             for f in files:
-                _f = os.path.abspath(os.path.join(root, f))
-                if (_f.endswith(include_ext)):
-                    filelist.append(_f)
+                yield f
+    finally:
+        for w in workers:
+            dirs.put(None)
+    for w in workers: # the walk is complete, the workers are idle
+        w.join()
+
+def _listdir(path):
+    """
+    Return the names of the subdirectories and of the files in a directory
+    """
+    dirs = []
+    files = []
+    if (scandir is not None):
+        for entry in scandir(path):
+            try:
+                if (entry.is_dir(follow_symlinks=False)):
+                    dirs.append(entry.name)
+                elif (entry.is_file()):
+                    files.append(entry.name)
+            except OSError:
+                continue
+    else:
+        for name in os.listdir(path):
+            full = os.path.join(path, name)
+            if (os.path.isdir(full) and not os.path.islink(full)):
+                dirs.append(name)
+            elif (os.path.isfile(full)):
+                files.append(name)
+    return dirs, files
+
+def Mean(values):
+    """
+    Return the arithmetic mean of a list of numbers, nan if it is empty
+    """
+    if (len(values) == 0):
+        return float("nan")
+    return sum(values)/float(len(values))
+
+def Median(values):
+    """
+    Return the median of a list of numbers, nan if it is empty
+    """
+    n = len(values)
+    if (n == 0):
+        return float("nan")
+    v = sorted(values)
+    if (n % 2 == 1):
+        return float(v[n//2])
+    return 0.5*(v[n//2-1] + v[n//2])
 
-    return filelist
+def treewalk(top_dir, include_ext=[], exclude_dirs=[], include=[], exclude=[], threads=1):
+    """
+    Walk a directory tree and return full path of all files that were found.
+
+    Args
+    ----
+    top_dir : str
+        The top directory where the search will begin
+    include_ext : list, optional
+        List of file extensions to include, e.g., to find
+        all Fortran files `include_ext=["f90", "f"]` or `include_ext=["fortran"]`.
+        The extensions are not case sensitive
+    exclude_dirs : list, optional
 
+        List of directories to exclude during the search. For example, to
+        exclude the `build` directory, `exclude_dirs=["build"]`
+    include, exclude, threads : optional
+        See iterwalk
 
+    Returns
+    -------
+    filelist : list
+        The resulting list of filenames, sorted
+    """
+    return sorted(iterwalk(top_dir, include_ext=include_ext, exclude_dirs=exclude_dirs,
+                           include=include, exclude=exclude, threads=threads))
@@ -0,0 +1,262 @@
+"""
+Stream the call graph to a file in one of several formats
+
+Every writer walks the graph once from the given roots and writes each node
+and edge as soon as it is reached, nothing but the set of visited routines is
+kept in memory.
+
+Examples
+--------
+>>> with open("tree.dot", "w") as mf:
+>>>     writer = GetWriter("dot")(mf, label=table.label)
+>>>     writer.write(graph, roots)
+"""
+from __future__ import print_function
+import json
+from itertools import islice
+from graph import FormatNode
+
+class Writer(object):
+    """
+    Base class of all writers
+
+    Args
+    ----
+    stream : file
+        Open file object that receives the output
+    label : function, optional
+        Maps a routine id to its display name, defaults to the id itself
+    interfaces : dict, optional
+        Dictionary holding interface_id:[specific routines] pairs, only used
+        by the writers that report the interfaces separately
+    prune : function, optional
+        Called with a routine id, the routine and the calls to it are left out
+        if it returns True, see utilities.CompileRoutinePatterns. The roots
+        are never pruned
+    max_depth, collapse : optional
+        Only used by the writers of calling trees, see CallGraph.tree
+    start, limit : int, optional
+        Only used by the writers of calling trees, write at most limit nodes
+        of the trees, starting with node number start
+    """
+
+    def __init__(self, stream, label=None, interfaces=None, prune=None, max_depth=None,
+                 collapse=True, start=0, limit=None):
+        self.stream = stream
+        self.label = label if (label is not None) else (lambda x: x)
+        self.interfaces = interfaces if (interfaces is not None) else {}
+        self.prune     = prune
+        self.max_depth = max_depth
+        self.collapse  = collapse
+        self.start     = start
+        self.limit     = limit
+
+    def write(self, graph, roots):
+        """
+        Write the part of the graph that is reachable from the roots
+        """
+        self.begin()
+        names = graph.names
+        seen = bytearray(len(graph)) # indexed by node id, 1 if visited, 2 if pruned
+        for root in roots:
+            r = graph.ids[root]
+            if (seen[r] == 1): continue
+            seen[r] = 1
+            self.node(root, graph.cycle(root))
+            stack = [r]
+            while (len(stack) > 0): # each routine is visited exactly once
+                u = stack.pop()
+                for v, ctype, e in graph.out_edges(u):
+                    if (not seen[v]) and self.pruned(names[v]):
+                        seen[v] = 2
+                    if (seen[v] == 2): continue
+                    if (not seen[v]):
+                        seen[v] = 1
+                        self.node(names[v], graph.cycle(names[v]))
+                        stack.append(v)
+                    self.edge(names[u], names[v], ctype, graph.counts[e],
+                              graph.edge_lines(e))
+        self.end()
+
+    def pruned(self, name):
+        """
+        Return True if the routine is left out, see prune
+        """
+        return (self.prune is not None) and self.prune(name)
+
+    def begin(self):
+        pass
+
+    def node(self, name, cycle):
+        pass
+
+    def edge(self, caller, callee, ctype, count, lines):
+        """
+        Called once for every unique (caller, callee) pair, count is the number
+        of call sites and lines holds their line numbers, see CallGraph.sites
+        """
+        pass
+
+    def end(self):
+        pass
+
+class TextWriter(Writer):
+    """
+    Indented calling tree of each root, repeated subtrees are only written once
+    """
+
+    def write(self, graph, roots):
+        label = self.label
+        mf = self.stream
+        mf.write("Main Program calls\n")
+        nodes = graph.forest(roots, self.max_depth, self.prune, self.collapse)
+        stop = None if (self.limit is None) else self.start + self.limit
+        for depth, name, repeat, cycle, hidden in islice(nodes, self.start, stop):
+            mf.write(FormatNode(depth, label(name), repeat, [label(m) for m in cycle],
+                                hidden)+"\n")
+        mf.write("\n")
+        mf.write("Interfaces\n")
+        for k in self.interfaces.keys():
+            if (self.pruned(k)): continue
+            mf.write("\t{}\n".format(label(k)))
+            for i in self.interfaces[k]:
+                mf.write("\t\t{}\n".format(i))
+
+class JSONLinesWriter(Writer):
+    """
+    One JSON object per line, either a node or an edge
+    """
+
+    def node(self, name, cycle):
+        record = {"type":"node", "id":name, "label":self.label(name)}
+        if (len(cycle) > 0):
+            record["cycle"] = list(cycle)
+        self.stream.write(json.dumps(record, sort_keys=True)+"\n")
+
+    def edge(self, caller, callee, ctype, count, lines):
+        record = {"type":"edge", "source":caller, "target":callee, "calltype":ctype,
+                  "count":count, "lines":lines}
+        self.stream.write(json.dumps(record, sort_keys=True)+"\n")
+
+class DotWriter(Writer):
+    """
+    Graphviz DOT digraph, recursive routines are drawn with a double border
+    """
+
+    def begin(self):
+        self.stream.write("digraph calltree {\n")
+
+    def node(self, name, cycle):
+        attrs = "label={}".format(json.dumps(self.label(name)))
+        if (len(cycle) > 0):
+            attrs += ", peripheries=2"
+        self.stream.write("  {} [{}];\n".format(json.dumps(name), attrs))
+
+    def edge(self, caller, callee, ctype, count, lines):
+        self.stream.write("  {} -> {} [calltype={}, count={}];\n".format(
+                          json.dumps(caller), json.dumps(callee), json.dumps(ctype),
+                          count))
+
+    def end(self):
+        self.stream.write("}\n")
+
+class GraphMLWriter(Writer):
+    """
+    GraphML document with a label on each node and the calltype, number of call
+    sites and their line numbers on each edge
+    """
+
+    def begin(self):
+        # xml pulls in a long chain of modules, only import it when needed
+        from xml.sax.saxutils import escape, quoteattr
+        self.escape, self.quoteattr = escape, quoteattr
+        self.stream.write('<?xml version="1.0" encoding="UTF-8"?>\n'
+            '<graphml xmlns="http://graphml.graphdrawing.org/xmlns">\n'
+            '  <key id="label" for="node" attr.name="label" attr.type="string"/>\n'
+            '  <key id="recursive" for="node" attr.name="recursive" attr.type="boolean"/>\n'
+            '  <key id="calltype" for="edge" attr.name="calltype" attr.type="string"/>\n'
+            '  <key id="count" for="edge" attr.name="count" attr.type="int"/>\n'
+            '  <key id="lines" for="edge" attr.name="lines" attr.type="string"/>\n'
+            '  <graph id="calltree" edgedefault="directed">\n')
+
+    def node(self, name, cycle):
+        self.stream.write('    <node id={}><data key="label">{}</data>'
+                          '<data key="recursive">{}</data></node>\n'.format(
+                          self.quoteattr(name), self.escape(self.label(name)),
+                          "true" if (len(cycle) > 0) else "false"))
+
+    def edge(self, caller, callee, ctype, count, lines):
+        self.stream.write('    <edge source={} target={}><data key="calltype">{}</data>'
+                          '<data key="count">{}</data><data key="lines">{}</data>'
+                          '</edge>\n'.format(self.quoteattr(caller), self.quoteattr(callee),
+                          self.escape(ctype), count, " ".join([str(l) for l in lines])))
+
+    def end(self):
+        self.stream.write("  </graph>\n</graphml>\n")
+
+class AdjacencyWriter(Writer):
+    """
+    Compact adjacency list, one line per routine: "caller callee callee ..."
+    """
+
+    def write(self, graph, roots):
+        names = graph.names
+        seen = bytearray(len(graph)) # indexed by node id, 1 if visited, 2 if pruned
+        stack = []
+        for root in reversed(roots):
+            r = graph.ids[root]
+            if (seen[r] != 1):
+                seen[r] = 1
+                stack.append(r)
+        while (len(stack) > 0):
+            u = stack.pop()
+            callees = graph.successors(u)
+            if (self.prune is not None):
+                for v in callees:
+                    if (not seen[v]) and self.pruned(names[v]):
+                        seen[v] = 2
+                callees = [v for v in callees if seen[v] != 2]
+            self.stream.write(" ".join([names[u]] + [names[v] for v in callees])+"\n")
+            for v in callees:
+                if (not seen[v]):
+                    seen[v] = 1
+                    stack.append(v)
+
+# output format:writer class pairs
+WRITERS = {"text"      : TextWriter,
+           "jsonl"     : JSONLinesWriter,
+           "dot"       : DotWriter,
+           "graphml"   : GraphMLWriter,
+           "adjacency" : AdjacencyWriter}
+
+# filename extension:output format pairs used to guess the format
+EXTENSIONS = {".jsonl"   : "jsonl",
+              ".dot"     : "dot",
+              ".gv"      : "dot",
+              ".graphml" : "graphml",
+              ".adj"     : "adjacency"}
+
+def GetWriter(fmt=None, filename=None):
+    """
+    Return the writer class for the given format
+
+    Args
+    ----
+    fmt : str, optional
+        One of "text", "jsonl", "dot", "graphml" or "adjacency"
+    filename : str, optional
+        If no format is given, it is guessed from the extension of the filename,
+        falling back to "text"
+
+    Returns
+    -------
+    writer : class
+        The Writer subclass, None if the format is not known
+    """
+    if (fmt is None):
+        fmt = "text"
+        if (filename is not None):
+            for ext in EXTENSIONS.keys():
+                if (filename.lower().endswith(ext)):
+                    fmt = EXTENSIONS[ext]
+    return WRITERS.get(fmt.lower())
@@ -0,0 +1,133 @@
+"""
+Measure the cold start of F90Tree
+
+Every case runs in a fresh interpreter, so the timings include the interpreter
+startup and all imports, which is what a hook or an editor integration pays
+for every short invocation. The interpreter startup alone is measured as the
+baseline and subtracted to give the cost of F90Tree itself.
+
+Usage:
+    coldstart.py [options]
+
+Options:
+    --repeat=<n>      Number of runs of each case [default: 10]
+    --budget=<ms>     Fail if the cost of any case, above the interpreter
+                      startup, exceeds this many milliseconds [default: 150]
+    --json=<f>        Save the results as JSON to the given filename
+    --python=<p>      The interpreter to measure, defaults to the current one
+"""
+from __future__ import print_function
+import os
+import sys
+import json
+import time
+import shutil
+import tempfile
+import subprocess
+
+# the package sources, the CLI is run from there
+SOURCE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "F90Tree")
+
+# a tiny source tree, parsing it takes a fraction of the startup
+PROGRAM = """\
+program driver
+    use utils, only: setup
+    call setup()
+    call finish()
+contains
+    subroutine finish()
+        call setup()
+    end subroutine finish
+end program driver
+"""
+MODULE = """\
+module utils
+contains
+    subroutine setup()
+        x = norm(1.0)
+    end subroutine setup
+    real function norm(x)
+        real :: x
+        norm = abs(x)
+    end function norm
+end module utils
+"""
+
+def Cases(tree):
+    """
+    Return the (name, arguments) pairs of the measured runs
+    """
+    return [("interpreter",   ["-c", "pass"]),
+            ("import main",   ["-c", "import main"]),
+            ("import server", ["-c", "import server"]),
+            ("cli usage",     ["test.py", "--help"]),
+            ("parse",         ["test.py", tree]),
+            ("callers",       ["test.py", "callers", tree, "setup"])]
+
+def Time(python, arguments, repeat):
+    """
+    Run the interpreter repeatedly and return the wall clock times in ms
+    """
+    times = []
+    with open(os.devnull, "w") as null:
+        for i in range(repeat):
+            start = time.time()
+            status = subprocess.call([python] + arguments, cwd=SOURCE, stdout=null,
+                                     stderr=subprocess.STDOUT)
+            times.append(1000.*(time.time() - start))
+            if (status != 0):
+                raise RuntimeError("failed to run {}".format(" ".join(arguments)))
+    return sorted(times)
+
+def Run(python=sys.executable, repeat=10, budget=150.):
+    """
+    Measure every case
+
+    Returns
+    -------
+    results : dict
+        The minimum and median time of each case in ms, its cost above the
+        interpreter startup and whether all costs are within the budget
+    """
+    tree = tempfile.mkdtemp()
+    try:
+        with open(os.path.join(tree, "main.F90"), "w") as mf:
+            mf.write(PROGRAM)
+        with open(os.path.join(tree, "utils.F90"), "w") as mf:
+            mf.write(MODULE)
+
+        cases = []
+        for name, arguments in Cases(tree):
+            times = Time(python, arguments, repeat)
+            cases.append({"case":name, "min":times[0], "median":times[len(times)//2]})
+    finally:
+        shutil.rmtree(tree)
+
+    baseline = cases[0]["median"]
+    for c in cases:
+        c["cost"] = c["median"] - baseline
+    return {"python":python, "repeat":repeat, "budget":budget,
+            "ok":all([c["cost"] <= budget for c in cases]), "cases":cases}
+
+if __name__ == "__main__":
+
+    from docopt import docopt
+
+    args = docopt(__doc__)
+
+    python = args["--python"] if (args["--python"] is not None) else sys.executable
+    results = Run(python, repeat=int(args["--repeat"]), budget=float(args["--budget"]))
+
+    print("\nCold start of F90Tree with {}, {} runs each\n".format(python, results["repeat"]))
+    print("\t{:<15} {:>10} {:>10} {:>10}".format("case", "min ms", "median ms", "cost ms"))
+    for c in results["cases"]:
+        print("\t{:<15} {:>10.1f} {:>10.1f} {:>10.1f}".format(c["case"], c["min"],
+              c["median"], c["cost"]))
+    print("\n\tbudget {:.0f} ms: {}\n".format(results["budget"],
+          "ok" if results["ok"] else "EXCEEDED"))
+
+    if (args["--json"] is not None):
+        with open(args["--json"], "w") as mf:
+            json.dump(results, mf, indent=2)
+
+    sys.exit(0 if results["ok"] else 1)
@@ -0,0 +1,195 @@
+"""
+Generate a synthetic Fortran source tree to benchmark F90Tree
+
+The tree holds one module per file and a program that calls the top level
+routines. The routines are spread over a number of levels, every routine calls
+routines of the next level, so the depth of the calling tree is bounded by the
+number of levels. Optional features exercise the harder parts of the parser:
+generic interfaces, recursion through calls back to a previous level, and
+calls split across continuation lines. The same seed gives the same tree.
+
+Usage:
+    generate.py [options] <directory>
+
+Options:
+    --files=<n>          Number of module files [default: 100]
+    --routines=<n>       Number of routines per file [default: 20]
+    --fanout=<n>         Number of calls made by each routine [default: 4]
+    --depth=<n>          Number of levels of the calling tree [default: 8]
+    --interfaces=<f>     Fraction of the files that define a generic interface
+                         [default: 0.2]
+    --recursion=<f>      Probability that a routine also calls back to the
+                         previous level, which creates cycles [default: 0.01]
+    --continuations=<f>  Probability that a call is split across continuation
+                         lines [default: 0.1]
+    --subdirs=<n>        Number of subdirectories the files are spread over
+                         [default: 4]
+    --seed=<s>           Seed of the random number generator [default: 1]
+"""
+from __future__ import print_function
+import os
+import random
+
+# the default shape of a tree, see the options above
+DEFAULTS = {"files":100, "routines":20, "fanout":4, "depth":8, "interfaces":0.2,
+            "recursion":0.01, "continuations":0.1, "subdirs":4, "seed":1}
+
+def Generate(directory, files=100, routines=20, fanout=4, depth=8, interfaces=0.2,
+             recursion=0.01, continuations=0.1, subdirs=4, seed=1):
+    """
+    Write a synthetic source tree
+
+    Args
+    ----
+    directory : str
+        The tree is written under this directory, it is created if needed
+    files, routines, fanout, depth, interfaces, recursion, continuations, subdirs, seed : optional
+        The shape of the tree, see the module docstring
+
+    Returns
+    -------
+    summary : dict
+        The number of files, lines, routines, interfaces and call sites that
+        were written
+    """
+    rng = random.Random(seed)
+    total = files*routines
+    depth = max(1, min(depth, total))
+
+    # routine g lives in file g // routines and on level g*depth // total
+    def module(g):
+        return "mod_{}".format(g // routines)
+    def name(g):
+        return "r{}_{}".format(g // routines, g % routines)
+    def is_function(g):
+        return (g % 3 == 2)
+    levels = [[] for l in range(depth)]
+    for g in range(total):
+        levels[g*depth // total].append(g)
+    level = {}
+    for l, members in enumerate(levels):
+        for g in members:
+            level[g] = l
+
+    # every file whose index is a multiple of the stride defines a generic
+    # interface over its first two routines
+    generic = {}
+    if ((interfaces > 0) and (routines >= 2)):
+        stride = max(1, int(round(1./interfaces)))
+        for i in range(0, files, stride):
+            if (not is_function(i*routines) and not is_function(i*routines+1)):
+                generic[i] = "gen_{}".format(i)
+
+    summary = {"files":0, "lines":0, "routines":total, "interfaces":len(generic), "calls":0}
+
+    def callees(g):
+        l = level[g]
+        targets = []
+        if (l+1 < depth):
+            targets = [rng.choice(levels[l+1]) for i in range(fanout)]
+        if ((l > 0) and (rng.random() < recursion)):
+            targets.append(rng.choice(levels[l-1]))
+        return targets
+
+    def call(target):
+        """
+        Return the lines of a single call to the target, its module and the
+        name that is called, either the routine or its generic interface
+        """
+        m = target // routines
+        if ((m in generic) and (target % routines < 2) and (rng.random() < 0.5)):
+            callee = generic[m]
+        else:
+            callee = name(target)
+        if (is_function(target)):
+            head = "x = x + {}(".format(callee)
+        else:
+            head = "call {}(".format(callee)
+        if (rng.random() < continuations):
+            lines = ["        " + head + "x, &", "                 n)"]
+        else:
+            lines = ["        " + head + "x, n)"]
+        return lines, module(target), callee
+
+    if (not os.path.isdir(directory)):
+        os.makedirs(directory)
+    for i in range(files):
+        sub = os.path.join(directory, "dir_{}".format(i % subdirs)) if (subdirs > 1) else directory
+        if (not os.path.isdir(sub)):
+            os.makedirs(sub)
+
+        lines = ["! synthetic module {} of {}".format(i, files),
+                 "module mod_{}".format(i),
+                 "    implicit none"]
+        if (i in generic):
+            lines += ["    interface {}".format(generic[i]),
+                      "        module procedure {}, {}".format(name(i*routines), name(i*routines+1)),
+                      "    end interface {}".format(generic[i])]
+        lines += ["contains"]
+        for j in range(routines):
+            g = i*routines + j
+            body = []
+            uses = {}
+            for t in callees(g):
+                c, m, callee = call(t)
+                body += c
+                if (m != "mod_{}".format(i)):
+                    uses.setdefault(m, [])
+                    if (callee not in uses[m]):
+                        uses[m].append(callee)
+                summary["calls"] += 1
+            if (is_function(g)):
+                lines += ["", "    real function {}(x, n)".format(name(g))]
+            else:
+                lines += ["", "    subroutine {}(x, n)".format(name(g))]
+            for m in sorted(uses.keys()):
+                lines += ["        use {}, only: {}".format(m, ", ".join(uses[m]))]
+            lines += ["        real :: x",
+                      "        integer :: n",
+                      "        ! level {}".format(level[g]),
+                      "        n = n + 1"]
+            lines += body
+            if (is_function(g)):
+                lines += ["        {} = x".format(name(g)),
+                          "    end function {}".format(name(g))]
+            else:
+                lines += ["    end subroutine {}".format(name(g))]
+        lines += ["end module mod_{}".format(i), ""]
+
+        with open(os.path.join(sub, "mod_{}.F90".format(i)), "w") as mf:
+            mf.write("\n".join(lines))
+        summary["files"] += 1
+        summary["lines"] += len(lines)
+
+    # the program calls every routine of the top level
+    lines = ["program bench", "    implicit none", "    real :: x", "    integer :: n"]
+    body = []
+    uses = {}
+    for g in levels[0]:
+        c, m, callee = call(g)
+        body += c
+        uses.setdefault(m, [])
+        if (callee not in uses[m]):
+            uses[m].append(callee)
+        summary["calls"] += 1
+    lines[1:1] = ["    use {}, only: {}".format(m, ", ".join(uses[m])) for m in sorted(uses.keys())]
+    lines += ["    x = 0.0", "    n = 0"] + body + ["end program bench", ""]
+    with open(os.path.join(directory, "bench.F90"), "w") as mf:
+        mf.write("\n".join(lines))
+    summary["files"] += 1
+    summary["lines"] += len(lines)
+
+    return summary
+
+if __name__ == "__main__":
+
+    from docopt import docopt
+
+    args = docopt(__doc__)
+
+    options = {}
+    for k in DEFAULTS.keys():
+        options[k] = type(DEFAULTS[k])(args["--"+k])
+    summary = Generate(args["<directory>"], **options)
+    print("\nWrote {files} files with {lines} lines, {routines} routines, "
+          "{interfaces} interfaces and {calls} call sites\n".format(**summary))
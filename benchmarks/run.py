@@ -0,0 +1,311 @@
+"""
+Benchmark F90Tree on synthetic source trees
+
+A tree is generated for every size, see generate.py, and the pipeline of
+main.Parse is run on it phase by phase: walking the directory, scanning the
+files for definitions and call candidates, building the symbol table,
+resolving the calls, building the call graph, expanding the calling tree and
+writing the output. The whole of main.Parse is timed as well. Each phase is
+run several times and the fastest run is kept.
+
+The results are printed and optionally saved as JSON, together with the
+version of the sources, so the numbers of two versions can be compared with
+--compare.
+
+Usage:
+    run.py [options]
+
+Options:
+    --sizes=<s>          Comma separated list of tree sizes: small, medium or
+                         large [default: small,medium]
+    --files=<n>          Override the number of files of every size
+    --routines=<n>       Override the number of routines per file
+    --fanout=<n>         Override the number of calls made by each routine
+    --depth=<n>          Override the number of levels of the calling tree
+    --interfaces=<f>     Override the fraction of files with an interface
+    --recursion=<f>      Override the probability of a recursive call
+    --continuations=<f>  Override the probability of a continued call
+    --repeat=<n>         Number of runs of each phase [default: 3]
+    --jobs=<n>           Number of processes used to scan the files [default: 1]
+    --memory             Measure the peak memory of a separate run with
+                         tracemalloc, which slows it down
+    --json=<f>           Save the results as JSON to the given filename
+    --compare=<f>        Compare with the results of an earlier run
+    --keep=<d>           Generate the trees under this directory and keep them,
+                         existing trees are reused
+"""
+from __future__ import print_function
+import os
+import sys
+import json
+import time
+import shutil
+import tempfile
+import platform
+import subprocess
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SOURCE = os.path.join(HERE, "..", "F90Tree")
+sys.path.insert(0, SOURCE)
+sys.path.insert(0, HERE)
+
+from generate import Generate, DEFAULTS
+from utilities import treewalk
+from parsers import ScanFiles, SCANNER_VERSION
+from symbols import SymbolTable
+from graph import CallGraph
+from writers import GetWriter
+import main
+
+# the shape of the trees, anything not given is taken from generate.DEFAULTS
+SIZES = {"small"  : {"files":50,   "routines":20},
+         "medium" : {"files":400,  "routines":25},
+         "large"  : {"files":2000, "routines":25, "depth":12}}
+
+# the phases of a run, in order
+PHASES = ("walk", "scan", "define", "resolve", "graph", "tree", "output")
+
+class Devnull(object):
+    """
+    File object that discards everything, keeps disk writes out of the timings
+    """
+    def write(self, text):
+        pass
+    def flush(self):
+        pass
+
+def Pipeline(directory, jobs=1, timings=None):
+    """
+    Run the pipeline of main.Parse once and return the time of every phase
+
+    Args
+    ----
+    directory : str
+        The source tree
+    jobs : int, optional
+        Number of processes used to scan the files
+    timings : dict, optional
+        Keep the fastest time of every phase in this dictionary
+
+    Returns
+    -------
+    timings : dict
+        Dictionary holding phase:seconds pairs
+    """
+    if (timings is None):
+        timings = {}
+    def lap(phase, start):
+        t = time.time() - start
+        timings[phase] = min(t, timings.get(phase, t))
+        return time.time()
+
+    start = time.time()
+    files = treewalk(directory, include_ext=["F90"])
+    start = lap("walk", start)
+
+    scans = ScanFiles(files, jobs=jobs)
+    start = lap("scan", start)
+
+    table = SymbolTable()
+    for scan in scans:
+        table.add_scan(scan)
+    interfaces = {}
+    for k in table.procedures():
+        if (table.scopes[k].kind == "interface"):
+            interfaces[k] = table.scopes[k].specifics
+    start = lap("define", start)
+
+    calls = []
+    for scan in scans:
+        c = scan.resolve_scopes(table)
+        calls += list(c.items())
+    for k in interfaces.keys():
+        calls.append((k, [[sid, "i"] for sid in table.specifics(k)]))
+    start = lap("resolve", start)
+
+    graph = CallGraph(calls)
+    start = lap("graph", start)
+
+    roots = [r for r in table.roots(["programs"]) if r in graph.ids]
+    expanded = set()
+    nodes = 0
+    for r in roots:
+        for node in graph.tree(r, expanded):
+            nodes += 1
+    start = lap("tree", start)
+
+    writer = GetWriter("text")
+    writer(Devnull(), label=table.label, interfaces=interfaces).write(graph, roots)
+    lap("output", start)
+    return timings
+
+def Parse(directory, jobs=1):
+    """
+    Time the whole of main.Parse, its messages are discarded
+    """
+    stdout = sys.stdout
+    sys.stdout = Devnull()
+    try:
+        start = time.time()
+        main.Parse(directory, include_ext=["F90"], jobs=jobs)
+        return time.time() - start
+    finally:
+        sys.stdout = stdout
+
+def PeakMemory(directory, jobs=1):
+    """
+    Return the peak of the memory allocated by python during the pipeline in
+    bytes, None if tracemalloc is not available
+    """
+    try:
+        import tracemalloc
+    except ImportError: # python 2
+        return None
+    tracemalloc.start()
+    try:
+        Pipeline(directory, jobs=jobs)
+        current, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak
+
+def MaxRSS():
+    """
+    Return the peak resident set size of this process in bytes, None if it is
+    not available on this platform
+    """
+    try:
+        import resource
+    except ImportError:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if (sys.platform == "darwin"): # bytes on macOS, kB elsewhere
+        return rss
+    return rss*1024
+
+def Version():
+    """
+    Return the git description of the sources, None if it is not known
+    """
+    try:
+        with open(os.devnull, "w") as null:
+            out = subprocess.check_output(["git", "describe", "--always", "--dirty"],
+                                          cwd=HERE, stderr=null)
+        return out.decode("utf-8").strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def Benchmark(size, shape, root, repeat=3, jobs=1, memory=False):
+    """
+    Generate one tree, unless it exists, and benchmark it
+
+    Returns
+    -------
+    result : dict
+        The shape and size of the tree, the time of every phase, the time of
+        main.Parse, the throughput and the peak memory
+    """
+    directory = os.path.join(root, size)
+    summary_file = os.path.join(directory, "summary.json")
+    if (os.path.isfile(summary_file)):
+        with open(summary_file, "r") as mf:
+            summary = json.load(mf)
+    if ((not os.path.isfile(summary_file)) or (summary.get("shape") != shape)):
+        if (os.path.isdir(directory)):
+            shutil.rmtree(directory)
+        summary = Generate(directory, **shape)
+        summary["shape"] = shape
+        with open(summary_file, "w") as mf:
+            json.dump(summary, mf)
+
+    timings = {}
+    parse = None
+    for i in range(repeat):
+        Pipeline(directory, jobs=jobs, timings=timings)
+        t = Parse(directory, jobs=jobs)
+        parse = t if (parse is None) else min(parse, t)
+    total = sum([timings[p] for p in PHASES])
+
+    result = {"size":size, "shape":shape, "files":summary["files"],
+              "lines":summary["lines"], "routines":summary["routines"],
+              "calls":summary["calls"], "phases":timings, "total":total, "parse":parse,
+              "lines_per_s":summary["lines"]/max(timings["scan"], 1e-9),
+              "files_per_s":summary["files"]/max(timings["scan"], 1e-9)}
+    if (memory):
+        result["peak_memory"] = PeakMemory(directory, jobs=jobs)
+    return result
+
+def Report(results, previous=None):
+    """
+    Print the results, and their ratio to the previous results if given
+    """
+    before = {}
+    if (previous is not None):
+        for r in previous["results"]:
+            before[r["size"]] = r
+    for r in results["results"]:
+        print("\n{} tree: {} files, {} lines, {} routines, {} call sites".format(r["size"],
+              r["files"], r["lines"], r["routines"], r["calls"]))
+        old = before.get(r["size"])
+        rows = [(p, r["phases"][p], old["phases"].get(p) if (old is not None) else None)
+                for p in PHASES]
+        rows += [("total", r["total"], old["total"] if (old is not None) else None),
+                 ("main.Parse", r["parse"], old["parse"] if (old is not None) else None)]
+        for phase, t, t_old in rows:
+            line = "\t{:<12} {:>10.2f} ms".format(phase, 1000.*t)
+            if (t_old):
+                line += "   {:>6.2f}x of {:.2f} ms".format(t/t_old, 1000.*t_old)
+            print(line)
+        print("\tscan throughput {:.0f} lines/s, {:.0f} files/s".format(r["lines_per_s"],
+              r["files_per_s"]))
+        if (r.get("peak_memory") is not None):
+            print("\tpeak python memory {:.1f} MB".format(r["peak_memory"]/1024.**2))
+    if (results.get("max_rss") is not None):
+        print("\npeak resident set size {:.1f} MB".format(results["max_rss"]/1024.**2))
+    print()
+
+if __name__ == "__main__":
+
+    from docopt import docopt
+
+    args = docopt(__doc__)
+
+    overrides = {}
+    for k in ["files", "routines", "fanout", "depth", "interfaces", "recursion",
+              "continuations"]:
+        if (args["--"+k] is not None):
+            overrides[k] = type(DEFAULTS[k])(args["--"+k])
+
+    root = args["--keep"]
+    if (root is None):
+        root = tempfile.mkdtemp()
+    results = []
+    try:
+        for size in args["--sizes"].split(","):
+            if (size not in SIZES):
+                print("\nERROR: unknown size = {}, expected one of {}\n".format(size,
+                      ", ".join(sorted(SIZES.keys()))))
+                sys.exit(1)
+            shape = dict(DEFAULTS)
+            shape.update(SIZES[size])
+            shape.update(overrides)
+            results.append(Benchmark(size, shape, root, repeat=int(args["--repeat"]),
+                                     jobs=int(args["--jobs"]), memory=args["--memory"]))
+    finally:
+        if (args["--keep"] is None):
+            shutil.rmtree(root)
+
+    results = {"version":Version(), "scanner_version":SCANNER_VERSION,
+               "python":platform.python_version(), "platform":platform.platform(),
+               "time":time.strftime("%Y-%m-%d %H:%M:%S"), "jobs":int(args["--jobs"]),
+               "repeat":int(args["--repeat"]), "max_rss":MaxRSS(), "results":results}
+
+    previous = None
+    if (args["--compare"] is not None):
+        with open(args["--compare"], "r") as mf:
+            previous = json.load(mf)
+    Report(results, previous)
+
+    if (args["--json"] is not None):
+        with open(args["--json"], "w") as mf:
+            json.dump(results, mf, indent=2, sort_keys=True)
@@ -45,7 +45,7 @@ def run_setup():
     PACKAGES=setuptools.find_packages()
 
     # specify packages that F90Tree requires
-    INSTALL_REQUIRES=["docopt", "numpy"]
+    INSTALL_REQUIRES=["docopt"]
 
     # various other package descriptors
     NAME = "F90Tree"
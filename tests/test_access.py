@@ -0,0 +1,70 @@
+"""
+Private module entities are not use associated
+"""
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "F90Tree"))
+from project import Project
+
+# helper is private by default, secret by an access statement, the external
+# procedures of the same names are the ones called from the program
+PRIVATE = """\
+module mm
+  implicit none
+  private
+  public :: api
+contains
+  subroutine api
+    call helper
+  end subroutine api
+  subroutine helper
+  end subroutine helper
+end module mm
+module nn
+  implicit none
+  private :: secret
+contains
+  subroutine secret
+  end subroutine secret
+  subroutine open_one
+  end subroutine open_one
+end module nn
+subroutine helper
+end subroutine helper
+subroutine secret
+end subroutine secret
+program drv
+  use mm
+  use nn
+  call api
+  call helper
+  call secret
+  call open_one
+end program drv
+"""
+
+class AccessTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        with open(os.path.join(self.directory, "access.f90"), "w") as mf:
+            mf.write(PRIVATE)
+        self.project = Project(self.directory, include_ext=["f90"])
+        self.project.refresh()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_private_not_exported(self):
+        self.assertEqual(self.project.graph.callees("drv"),
+                         ["mm::api", "helper", "secret", "nn::open_one"])
+
+    def test_private_used_inside_module(self):
+        self.assertEqual(self.project.graph.callees("mm::api"), ["mm::helper"])
+
+if (__name__ == "__main__"):
+    unittest.main()
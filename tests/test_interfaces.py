@@ -0,0 +1,71 @@
+"""
+Generic interfaces and the specific procedures they dispatch to
+"""
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "F90Tree"))
+from project import Project
+
+# the generic interface norm shares its name with one of its specifics
+SHARED_NAME = """\
+module mm
+  implicit none
+  interface norm
+     module procedure norm, norm_int
+  end interface norm
+contains
+  function norm(x)
+    real :: x, norm
+    call helper
+    norm = abs(x)
+  end function norm
+  function norm_int(i)
+    integer :: i, norm_int
+    norm_int = abs(i)
+  end function norm_int
+  subroutine helper
+  end subroutine helper
+end module mm
+program drv
+  use mm
+  real :: y
+  y = norm(1.0)
+end program drv
+"""
+
+class SharedNameTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        with open(os.path.join(self.directory, "mm.f90"), "w") as mf:
+            mf.write(SHARED_NAME)
+        self.project = Project(self.directory, include_ext=["f90"])
+        self.project.refresh()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_ids(self):
+        kinds = dict([(sid, s.kind) for sid, s in self.project.table.scopes.items()])
+        self.assertEqual(kinds["mm::interface:norm"], "interface")
+        self.assertEqual(kinds["mm::norm"], "function")
+
+    def test_call_goes_to_generic(self):
+        self.assertEqual(self.project.graph.callees("drv"), ["mm::interface:norm"])
+
+    def test_dispatch(self):
+        self.assertEqual(self.project.table.specifics("mm::interface:norm"),
+                         ["mm::norm", "mm::norm_int"])
+        self.assertEqual(self.project.graph.callees("mm::interface:norm"),
+                         ["mm::norm", "mm::norm_int"])
+
+    def test_specific_keeps_its_calls(self):
+        self.assertEqual(self.project.graph.callees("mm::norm"), ["mm::helper"])
+        self.assertIn("mm::helper", self.project.graph.reachable("drv"))
+
+if (__name__ == "__main__"):
+    unittest.main()
@@ -0,0 +1,60 @@
+"""
+The memory mapped scan gives the same results as the text scan
+"""
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "F90Tree"))
+from parsers import ScanFile
+
+# labeled and continued statements, the lines without a parenthesis are the
+# ones the mapped scan may skip
+LABELED = """\
+subroutine top(n)
+  integer :: n, i
+  do 10 i = 1, n
+     x = x + 1
+10  call leaf
+20 continue
+  call &
+       leaf2
+  call leaf3 &
+       ()
+  y = 1 + &
+      2; call leaf4
+100 format(i5)
+30 end subroutine top
+subroutine other
+  call leaf
+end subroutine other
+"""
+
+class MappedTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.filename = os.path.join(self.directory, "labeled.f90")
+        with open(self.filename, "w") as mf:
+            mf.write(LABELED)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def scan(self, mapped):
+        scan = ScanFile(self.filename, mapped=mapped)
+        return list(scan.scopes.keys()), scan.candidates
+
+    def test_same_as_text(self):
+        self.assertEqual(self.scan(True), self.scan(False))
+
+    def test_labeled_statements(self):
+        scopes, candidates = self.scan(True)
+        self.assertEqual(scopes, ["top", "other"])
+        self.assertEqual(candidates["top"], [["leaf", "s", 5], ["leaf2", "s", 7],
+                                             ["leaf3", "s", 9], ["leaf4", "s", 12]])
+
+if (__name__ == "__main__"):
+    unittest.main()